@@ -0,0 +1,120 @@
+"""Concurrent checkouts of one SKU through the stock reservation path.
+
+Run from the backend directory:
+
+    python -m benchmarks.flash_sale --buyers 500 --stock 2000
+    python -m benchmarks.flash_sale --engine mongo --buyers 500 --stock 2000
+
+Every buyer loops reserve -> place order -> commit until the SKU sells out;
+a fraction abandon their checkout instead, and their stock comes back when
+the reservation expires. Reports orders/sec and checkout latency, then
+checks that units sold plus remaining stock equals the starting stock.
+The mongo engine uses a scratch database (--db) that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from benchmarks.stats import summarize, format_summary
+from inventory import Inventory, OutOfStock
+from storage import MemoryStorage, MotorStorage
+
+PRODUCT_ID = "flash-sale-candle"
+
+async def buyer(inventory, storage, buyer_id, quantity, abandon, rng, latencies, outcomes):
+    while True:
+        started = time.perf_counter()
+        try:
+            reservation = await inventory.reserve(str(uuid.uuid4()), buyer_id, {PRODUCT_ID: quantity})
+        except OutOfStock:
+            outcomes["sold_out"] += 1
+            return
+        if rng.random() < abandon:
+            outcomes["abandoned"] += 1
+            continue
+        await storage.orders.insert({
+            "orderId": reservation["id"],
+            "userId": buyer_id,
+            "items": [{"productId": PRODUCT_ID, "quantity": quantity}],
+            "total": 0.0,
+            "status": "pending",
+            "orderDate": datetime.now(timezone.utc).isoformat(),
+        })
+        await inventory.commit(reservation)
+        latencies.append((time.perf_counter() - started) * 1000)
+        outcomes["orders"] += 1
+
+async def sold_units(storage, engine):
+    if engine == "memory":
+        orders = storage.orders.docs.values()
+    else:
+        orders = await storage.db.orders.find({}, {"_id": 0, "items": 1}).to_list(None)
+    return sum(item["quantity"] for order in orders for item in order["items"])
+
+async def main(args):
+    client = None
+    if args.engine == "mongo":
+        load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+        client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'), maxPoolSize=args.pool_size)
+        await client.drop_database(args.db)
+        storage = MotorStorage(client[args.db])
+        await storage.prepare()
+    else:
+        storage = MemoryStorage()
+
+    try:
+        await storage.products.insert({
+            "id": PRODUCT_ID, "name": "Flash Sale Candle", "price": 499.0, "category": "Jar Candles",
+            "stock": args.stock, "featured": True, "dateAdded": datetime.now(timezone.utc).isoformat(),
+        })
+        inventory = Inventory(storage, ttl=args.ttl)
+        latencies, outcomes = [], {"orders": 0, "abandoned": 0, "sold_out": 0}
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            buyer(inventory, storage, f"buyer-{i}", args.quantity, args.abandon, random.Random(args.seed + i), latencies, outcomes)
+            for i in range(args.buyers)
+        ))
+        elapsed = time.perf_counter() - started
+
+        # Abandoned reservations still hold stock until they expire
+        await asyncio.sleep(args.ttl)
+        released = await inventory.release_expired()
+        remaining = (await storage.products.get(PRODUCT_ID))["stock"]
+        sold = await sold_units(storage, args.engine)
+    finally:
+        if client:
+            await client.drop_database(args.db)
+            client.close()
+
+    summary = summarize(latencies, elapsed)
+    print(format_summary(f"checkout ({args.buyers} buyers)", summary))
+    print(f"orders: {outcomes['orders']}  abandoned: {outcomes['abandoned']} (released {released})  "
+          f"units sold: {sold}/{args.stock}  remaining stock: {remaining}")
+    oversold = sold + remaining != args.stock or remaining < 0
+    print("OVERSOLD" if oversold else "No oversell: units sold + remaining stock == starting stock")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"checkout": summary, "outcomes": outcomes, "sold": sold, "remaining": remaining, "args": vars(args)}, f, indent=2)
+    return 1 if oversold else 0
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--engine", choices=["memory", "mongo"], default="memory")
+    parser.add_argument("--db", default="bench_flash_sale", help="scratch database for --engine mongo")
+    parser.add_argument("--pool-size", type=int, default=100, help="MongoDB connection pool size")
+    parser.add_argument("--buyers", type=int, default=500, help="concurrent buyers")
+    parser.add_argument("--stock", type=int, default=2000, help="starting stock of the SKU")
+    parser.add_argument("--quantity", type=int, default=1, help="units per order")
+    parser.add_argument("--abandon", type=float, default=0.05, help="fraction of checkouts abandoned")
+    parser.add_argument("--ttl", type=float, default=1.0, help="reservation lifetime in seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="write results as JSON")
+    sys.exit(asyncio.run(main(parser.parse_args())))
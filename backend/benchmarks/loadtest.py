@@ -0,0 +1,249 @@
+"""Mixed-traffic HTTP load test for the API.
+
+Seed a local database (or use ``python init_db.py --scale``), start the API
+against it, then drive traffic:
+
+    python -m benchmarks.loadtest seed --products 5000 --users 200
+    uvicorn server:app --port 8000 --workers 1
+    python -m benchmarks.loadtest run --url http://localhost:8000 --users 50 --duration 60 \\
+        --output results/$(git rev-parse --short HEAD).json
+
+Each virtual user logs in once and then loops over weighted scenarios
+(browse, search, view product, update cart, checkout, admin dashboard).
+Results hold per-endpoint throughput and p50/p95/p99 latency; pass
+``--compare`` with an earlier results file to print the change.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from passlib.context import CryptContext
+from pymongo import ReplaceOne
+from benchmarks.stats import summarize, format_summary
+from indexes import ensure_indexes
+from init_db import CATEGORY_WEIGHTS, generate_product
+from stats import rebuild_stats
+
+BENCH_PASSWORD = "bench123"
+BENCH_ADMIN_EMAIL = "bench-admin@bench.local"
+
+CATEGORIES = list(CATEGORY_WEIGHTS)
+
+# Relative frequency of each scenario in the traffic mix
+SCENARIOS = {
+    "browse": 40,
+    "search": 15,
+    "view_product": 25,
+    "update_cart": 10,
+    "checkout": 5,
+    "admin_dashboard": 5,
+}
+
+def bench_email(i):
+    return f"bench-user-{i}@bench.local"
+
+def connect():
+    load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    return client, client[os.environ.get('DB_NAME', 'test_database')]
+
+async def seed(args):
+    client, db = connect()
+    try:
+        # One hash shared by every bench account; bcrypt per user would dominate seeding
+        password = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+        now = datetime.now(timezone.utc).isoformat()
+        await db.users.delete_many({"email": {"$regex": r"@bench\.local$"}})
+        users = [
+            {"id": str(uuid.uuid4()), "name": f"Bench User {i}", "email": bench_email(i), "password": password, "role": "user", "createdAt": now}
+            for i in range(args.users)
+        ]
+        users.append({"id": str(uuid.uuid4()), "name": "Bench Admin", "email": BENCH_ADMIN_EMAIL, "password": password, "role": "admin", "createdAt": now})
+        await db.users.insert_many(users)
+
+        rng = random.Random(args.seed)
+        started = time.perf_counter()
+        for offset in range(0, args.products, args.batch_size):
+            batch = [generate_product(rng, i, datetime.now(timezone.utc)) for i in range(offset, min(offset + args.batch_size, args.products))]
+            # Ids follow from --seed, so a rerun replaces what the last one seeded
+            await db.products.bulk_write([ReplaceOne({"id": product["id"]}, product, upsert=True) for product in batch], ordered=False)
+        elapsed = time.perf_counter() - started
+
+        await ensure_indexes(db)
+        await rebuild_stats(db)
+        print(f"Seeded {len(users)} users and {args.products} products ({args.products / max(elapsed, 1e-9):.0f} products/s)")
+    finally:
+        client.close()
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    async def call(self, client, name, method, url, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+            status = response.status_code
+        except httpx.HTTPError:
+            response, status = None, "error"
+        self.latencies[name].append((time.perf_counter() - started) * 1000)
+        self.statuses[name][str(status)] += 1
+        return response
+
+async def virtual_user(client, recorder, email, catalog, stop, rng):
+    response = await recorder.call(client, "POST /api/auth/login", "POST", "/api/auth/login", json={"email": email, "password": BENCH_PASSWORD})
+    if response is None or response.status_code != 200:
+        return
+    auth = {"Authorization": f"Bearer {response.json()['access_token']}"}
+    names, weights = zip(*SCENARIOS.items())
+    cart = {}
+
+    while not stop.is_set():
+        scenario = rng.choices(names, weights)[0]
+        if scenario == "browse":
+            params = {"limit": 24}
+            if rng.random() < 0.5:
+                params["category"] = rng.choice(CATEGORIES)
+            await recorder.call(client, "GET /api/products", "GET", "/api/products", params=params)
+        elif scenario == "search":
+            await recorder.call(client, "GET /api/products?search", "GET", "/api/products", params={"search": rng.choice(catalog["terms"]), "limit": 24})
+        elif scenario == "view_product":
+            await recorder.call(client, "GET /api/products/{id}", "GET", f"/api/products/{rng.choice(catalog['ids'])}")
+        elif scenario == "update_cart":
+            product_id = rng.choice(catalog["ids"])
+            cart[product_id] = cart.get(product_id, 0) + 1
+            items = [{"productId": pid, "quantity": qty} for pid, qty in cart.items()]
+            await recorder.call(client, "POST /api/cart", "POST", "/api/cart", json=items, headers=auth)
+        elif scenario == "checkout":
+            if not cart:
+                cart[rng.choice(catalog["ids"])] = 1
+            order = {
+                "items": [{"productId": pid, "quantity": qty} for pid, qty in cart.items()],
+                "shippingAddress": {
+                    "fullName": "Bench User", "email": email, "phone": "9999999999",
+                    "addressLine1": "1 Load Test Lane", "city": "Pune", "state": "MH", "pinCode": "411001",
+                },
+                "paymentMethod": "UPI",
+                "upiId": "bench@upi",
+            }
+            await recorder.call(client, "POST /api/orders", "POST", "/api/orders", json=order, headers=auth)
+            cart.clear()
+        elif scenario == "admin_dashboard":
+            await recorder.call(client, "GET /api/admin/dashboard", "GET", "/api/admin/dashboard", headers=catalog["admin_auth"])
+
+async def load_catalog(client, max_products=2000):
+    ids, names, cursor = [], [], None
+    while len(ids) < max_products:
+        params = {"limit": 200, **({"cursor": cursor} if cursor else {})}
+        response = await client.get("/api/products", params=params)
+        response.raise_for_status()
+        page = response.json()
+        ids += [p["id"] for p in page]
+        names += [p["name"] for p in page]
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    if not ids:
+        sys.exit("No products found; run the 'seed' command first")
+    terms = sorted({word.lower() for name in names for word in name.split() if not word.isdigit()})
+    response = await client.post("/api/auth/login", json={"email": BENCH_ADMIN_EMAIL, "password": BENCH_PASSWORD})
+    response.raise_for_status()
+    return {"ids": ids, "terms": terms, "admin_auth": {"Authorization": f"Bearer {response.json()['access_token']}"}}
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.users + 1)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        catalog = await load_catalog(client)
+        recorder, stop = Recorder(), asyncio.Event()
+        users = [
+            virtual_user(client, recorder, bench_email(i % args.seeded_users), catalog, stop, random.Random(args.seed + i))
+            for i in range(args.users)
+        ]
+        tasks = [asyncio.create_task(u) for u in users]
+        await asyncio.sleep(args.warmup)
+        recorder.latencies.clear()
+        recorder.statuses.clear()
+        started = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await asyncio.gather(*tasks)
+
+    endpoints = {
+        name: {**summarize(latencies, elapsed), "statuses": dict(recorder.statuses[name])}
+        for name, latencies in sorted(recorder.latencies.items())
+    }
+    all_latencies = [ms for latencies in recorder.latencies.values() for ms in latencies]
+    results = {
+        "revision": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("func", "compare", "output")},
+        "total": summarize(all_latencies, elapsed),
+        "endpoints": endpoints,
+    }
+
+    for name, summary in endpoints.items():
+        print(format_summary(name, summary))
+    print(format_summary("TOTAL", results["total"]))
+    if args.compare:
+        compare(results, json.loads(Path(args.compare).read_text()))
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.output).write_text(json.dumps(results, indent=2))
+        print(f"Results written to {args.output}")
+
+def compare(current, previous):
+    print(f"\nChange vs {previous.get('revision') or 'previous run'} (p99, throughput):")
+    rows = {**current["endpoints"], "TOTAL": current["total"]}
+    baseline = {**previous["endpoints"], "TOTAL": previous["total"]}
+    for name, summary in rows.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        p99 = (summary["p99_ms"] - old["p99_ms"]) / old["p99_ms"] * 100 if old["p99_ms"] else 0.0
+        rps = (summary["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        print(f"{name:<32} p99 {p99:+7.1f}%   throughput {rps:+7.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(required=True)
+
+    seed_parser = commands.add_parser("seed", help="insert bench users and synthetic products")
+    seed_parser.add_argument("--products", type=int, default=5000)
+    seed_parser.add_argument("--users", type=int, default=200)
+    seed_parser.add_argument("--batch-size", type=int, default=1000)
+    seed_parser.add_argument("--seed", type=int, default=1, help="random seed for the generated catalog")
+    seed_parser.set_defaults(func=seed)
+
+    run_parser = commands.add_parser("run", help="drive mixed traffic against a running API")
+    run_parser.add_argument("--url", default="http://localhost:8000")
+    run_parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    run_parser.add_argument("--seeded-users", type=int, default=200, help="bench accounts created by 'seed'")
+    run_parser.add_argument("--duration", type=float, default=30.0, help="measured seconds")
+    run_parser.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds before the run")
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--seed", type=int, default=1, help="random seed for the traffic mix")
+    run_parser.add_argument("--output", help="write results as JSON")
+    run_parser.add_argument("--compare", help="earlier results JSON to compare against")
+    run_parser.set_defaults(func=run)
+
+    args = parser.parse_args()
+    asyncio.run(args.func(args))
@@ -0,0 +1,63 @@
+"""Catalog read latency while the server is hit by a burst of logins.
+
+Start the API, then run from the backend directory:
+
+    python -m benchmarks.login_storm --url http://localhost:8000
+
+To compare against hashing on the event loop, restart the API with
+PASSWORD_HASH_WORKERS=0 and run the benchmark again.
+"""
+import argparse
+import asyncio
+import json
+import time
+import httpx
+from benchmarks.stats import summarize, format_summary
+
+async def read_products(client, stop, latencies):
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get("/api/products", params={"limit": 20})
+        response.raise_for_status()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+async def login_loop(client, stop, credentials, outcomes):
+    while not stop.is_set():
+        response = await client.post("/api/auth/login", json=credentials)
+        outcomes[response.status_code] = outcomes.get(response.status_code, 0) + 1
+
+async def phase(client, duration, readers, logins, credentials):
+    stop = asyncio.Event()
+    latencies, outcomes = [], {}
+    tasks = [asyncio.create_task(read_products(client, stop, latencies)) for _ in range(readers)]
+    tasks += [asyncio.create_task(login_loop(client, stop, credentials, outcomes)) for _ in range(logins)]
+    await asyncio.sleep(duration)
+    stop.set()
+    await asyncio.gather(*tasks)
+    return summarize(latencies, duration), outcomes
+
+async def main(args):
+    credentials = {"email": args.email, "password": args.password}
+    limits = httpx.Limits(max_connections=args.readers + args.logins)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        (await client.post("/api/auth/login", json=credentials)).raise_for_status()
+        baseline, _ = await phase(client, args.duration, args.readers, 0, credentials)
+        storm, outcomes = await phase(client, args.duration, args.readers, args.logins, credentials)
+
+    print(format_summary("/api/products (idle)", baseline))
+    print(format_summary(f"/api/products ({args.logins} logins)", storm))
+    print("login responses:", ", ".join(f"{code}: {n}" for code, n in sorted(outcomes.items())))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"baseline": baseline, "storm": storm, "logins": outcomes, "args": vars(args)}, f, indent=2)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--email", default="user@candles.com")
+    parser.add_argument("--password", default="user123")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per phase")
+    parser.add_argument("--readers", type=int, default=8, help="concurrent catalog readers")
+    parser.add_argument("--logins", type=int, default=50, help="concurrent login loops")
+    parser.add_argument("--output", help="write results as JSON")
+    asyncio.run(main(parser.parse_args()))
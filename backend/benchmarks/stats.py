@@ -0,0 +1,30 @@
+import math
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[k]
+
+def summarize(latencies_ms, elapsed_s=None):
+    values = sorted(latencies_ms)
+    summary = {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values), 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+        "max_ms": round(values[-1], 3) if values else 0.0,
+    }
+    if elapsed_s:
+        summary["throughput_rps"] = round(len(values) / elapsed_s, 1)
+    return summary
+
+def format_summary(name, summary):
+    line = (
+        f"{name:<32} n={summary['count']:<7} p50={summary['p50_ms']:>8.2f}ms "
+        f"p95={summary['p95_ms']:>8.2f}ms p99={summary['p99_ms']:>8.2f}ms"
+    )
+    if "throughput_rps" in summary:
+        line += f" {summary['throughput_rps']:>8.1f} req/s"
+    return line
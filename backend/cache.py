@@ -0,0 +1,243 @@
+import time
+from collections import OrderedDict, defaultdict
+
+_MISSING = object()
+
+class TTLCache:
+    """Bounded mapping with least-recently-used eviction and per-entry expiry."""
+
+    def __init__(self, maxsize=1024, ttl=300, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        entry = self._data.get(key)
+        return entry is not None and entry[0] > self.clock()
+
+    def get(self, key, default=None):
+        entry = self._data.get(key, _MISSING)
+        if entry is _MISSING:
+            self.misses += 1
+            return default
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._data[key]
+            self.misses += 1
+            return default
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self._data[key] = (self.clock() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    def pop(self, key):
+        entry = self._data.pop(key, None)
+        return entry[1] if entry else None
+
+    def items(self):
+        # (key, value) pairs, expired ones included
+        return [(key, value) for key, (_, value) in self._data.items()]
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+class CatalogCache:
+    """Product documents by id, product listings and facet counts by
+    normalized filters.
+
+    Facet counts have no TTL by default: any catalog write drops them.
+
+    A reader takes a ``snapshot()`` before reading storage and passes it to
+    ``put_*``, so it cannot re-insert data that was already stale. Product
+    writes bump ``generation`` and fail every fill that started before them.
+    Stock moves are far more frequent and fail only the fills that hold a
+    moved product; they also evict the listings that contain it, since
+    listing ETags are derived from the versions of their products.
+
+    With ``write_lag`` (seconds a write may take to reach the replica reads),
+    ``read_primary`` tells a refill to read from the primary while the data
+    it is about to cache may predate a recent write.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, facet_ttl=float("inf"), write_lag=0, clock=time.monotonic):
+        self.products = TTLCache(maxsize, ttl, clock)
+        self.listings = TTLCache(maxsize, ttl, clock)
+        self.facets = TTLCache(maxsize, facet_ttl, clock)
+        self.write_lag = write_lag
+        self.clock = clock
+        self.generation = 0
+        self.written_at = float("-inf")
+        self.moves = 0
+        # product_id -> (value of `moves`, clock) at its last stock move;
+        # reset with every generation, which already fails older snapshots
+        # and starts a new write_lag window for every product
+        self.moved_at = {}
+        # product_id -> keys of the cached listings that contain it; rebuilt
+        # from the live listings once that many fills went in since
+        self.listed = defaultdict(set)
+        self._fills = 0
+
+    def snapshot(self):
+        return self.generation, self.moves
+
+    def _fresh(self, snapshot, product_ids):
+        generation, moves = snapshot
+        return generation == self.generation and all(self.moved_at.get(pid, (0,))[0] <= moves for pid in product_ids)
+
+    def read_primary(self, product_ids=()):
+        """Whether a product write, or a stock move of one of ``product_ids``,
+        happened within the last ``write_lag`` seconds."""
+        if not self.write_lag:
+            return False
+        since = self.clock() - self.write_lag
+        return self.written_at > since or any(self.moved_at.get(pid, (0, since))[1] > since for pid in product_ids)
+
+    def _next_generation(self):
+        self.generation += 1
+        self.written_at = self.clock()
+        self.moved_at.clear()
+
+    def get_product(self, product_id):
+        return self.products.get(product_id)
+
+    def put_product(self, product, snapshot):
+        if self._fresh(snapshot, [product["id"]]):
+            self.products.set(product["id"], product)
+
+    def get_listing(self, key):
+        return self.listings.get(key)
+
+    def put_listing(self, key, products, snapshot):
+        if not self._fresh(snapshot, [p["id"] for p in products]):
+            return
+        self.listings.set(key, products)
+        self._fills += 1
+        if self._fills > self.listings.maxsize:
+            # Drops the keys of listings that expired or were pushed out
+            self._fills = 0
+            self.listed.clear()
+            for listing_key, listing in self.listings.items():
+                for product in listing:
+                    self.listed[product["id"]].add(listing_key)
+        else:
+            for product in products:
+                self.listed[product["id"]].add(key)
+
+    def get_facets(self, key):
+        return self.facets.get(key)
+
+    def put_facets(self, key, facets, snapshot):
+        # Facets count categories and prices, which stock moves leave alone
+        if snapshot[0] == self.generation:
+            self.facets.set(key, facets)
+
+    def _clear_listings(self):
+        self.listings.clear()
+        self.listed.clear()
+
+    def product_created(self, product_id):
+        # A new product can match any listing
+        self._next_generation()
+        self._clear_listings()
+        self.facets.clear()
+
+    def product_updated(self, product_id):
+        self._next_generation()
+        self.products.pop(product_id)
+        self._clear_listings()
+        self.facets.clear()
+
+    def stock_changed(self, product_ids):
+        # Stock moves bump the version, so the product and the listings
+        # showing it (and their ETags) go; other entries stay
+        self.moves += 1
+        now = self.clock()
+        for product_id in product_ids:
+            self.moved_at[product_id] = (self.moves, now)
+            self.products.pop(product_id)
+            for key in self.listed.pop(product_id, ()):
+                self.listings.pop(key)
+
+    def product_deleted(self, product_id):
+        # Only listings that actually contained the product change
+        self._next_generation()
+        self.products.pop(product_id)
+        for key in self.listed.pop(product_id, ()):
+            self.listings.pop(key)
+        self.facets.clear()
+
+    def clear(self):
+        self._next_generation()
+        self.products.clear()
+        self._clear_listings()
+        self.facets.clear()
+
+    def stats(self):
+        return {"products": self.products.stats(), "listings": self.listings.stats(), "facets": self.facets.stats()}
+
+class PrincipalCache:
+    """Verified bearer tokens and the users they resolve to.
+
+    Token entries never outlive the token's own ``exp`` claim. User entries
+    are dropped with ``invalidate_user`` whenever the user record changes.
+    """
+
+    def __init__(self, maxsize=10000, ttl=30, clock=time.time):
+        self.clock = clock
+        self.tokens = TTLCache(maxsize, ttl, clock)
+        self.users = TTLCache(maxsize, ttl, clock)
+        self.generation = 0
+
+    def get_token(self, token):
+        return self.tokens.get(token)
+
+    def put_token(self, token, user_id, expires_at=None):
+        ttl = self.tokens.ttl
+        if expires_at is not None:
+            ttl = min(ttl, expires_at - self.clock())
+        if ttl > 0:
+            self.tokens.set(token, user_id, ttl)
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def put_user(self, user, generation):
+        if generation == self.generation:
+            self.users.set(user.id, user)
+
+    def invalidate_user(self, user_id):
+        self.generation += 1
+        self.users.pop(user_id)
+
+    def clear(self):
+        self.generation += 1
+        self.tokens.clear()
+        self.users.clear()
+
+    def stats(self):
+        return {"tokens": self.tokens.stats(), "users": self.users.stats()}
@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timezone
+
+# Cart mutations are applied as per-product operations:
+#   ("add", n)  - add n to the item's quantity, creating the item if needed
+#   ("set", n)  - set the quantity; 0 removes the item
+# Mutations from the same user arriving close together are merged into one
+# operation per product and written with a single update.
+
+def merge_op(ops, product_id, kind, quantity):
+    if kind == "add" and product_id in ops:
+        previous_kind, previous = ops[product_id]
+        ops[product_id] = (previous_kind, previous + quantity)
+    else:
+        ops[product_id] = (kind, quantity)
+
+class _Batch:
+    def __init__(self, future):
+        self.future = future
+        self.replace = None
+        self.ops = {}
+
+class CartCoalescer:
+    """Coalesces a user's cart mutations into one write per ``delay`` window.
+
+    At most one batch per user is open and one is being written. Every
+    caller whose mutation went into a batch gets the cart as written by it.
+    """
+
+    def __init__(self, storage, delay=0.02):
+        self.storage = storage
+        self.delay = delay
+        self.mutations = 0
+        self.writes = 0
+        self._open = {}
+        self._last = {}
+        self._tasks = set()
+
+    def _batch(self, user_id):
+        batch = self._open.get(user_id)
+        if batch is None:
+            batch = self._open[user_id] = _Batch(asyncio.get_running_loop().create_future())
+            previous = self._last.get(user_id)
+            self._last[user_id] = batch.future
+            task = asyncio.create_task(self._flush(user_id, batch, previous))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return batch
+
+    async def _flush(self, user_id, batch, previous):
+        # Writes for one user are applied in order; the batch keeps
+        # collecting mutations while the previous one is written
+        if previous is not None:
+            await asyncio.wait([previous])
+        await asyncio.sleep(self.delay)
+        del self._open[user_id]
+        try:
+            self.writes += 1
+            cart = await self.storage.carts.apply(
+                user_id, batch.replace, batch.ops, datetime.now(timezone.utc).isoformat()
+            )
+            batch.future.set_result(cart)
+        except Exception as e:
+            batch.future.set_exception(e)
+        finally:
+            if self._last.get(user_id) is batch.future:
+                del self._last[user_id]
+
+    async def _submit(self, batch):
+        self.mutations += 1
+        # Shielded: a disconnecting client must not cancel other callers' write
+        return await asyncio.shield(batch.future)
+
+    async def replace(self, user_id, items):
+        batch = self._batch(user_id)
+        batch.replace, batch.ops = list(items), {}
+        return await self._submit(batch)
+
+    async def add(self, user_id, product_id, quantity):
+        batch = self._batch(user_id)
+        merge_op(batch.ops, product_id, "add", quantity)
+        return await self._submit(batch)
+
+    async def set_quantity(self, user_id, product_id, quantity):
+        batch = self._batch(user_id)
+        merge_op(batch.ops, product_id, "set", quantity)
+        return await self._submit(batch)
+
+    async def remove(self, user_id, product_id):
+        return await self.set_quantity(user_id, product_id, 0)
+
+    def stats(self):
+        return {"mutations": self.mutations, "writes": self.writes, "pending": len(self._open)}
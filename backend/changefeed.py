@@ -0,0 +1,201 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+from pymongo.errors import OperationFailure, PyMongoError
+from metrics import registry, Counter
+
+logger = logging.getLogger(__name__)
+
+# Cross-worker cache invalidation. Every worker tails the change streams of
+# the collections it caches and hands each change to the subscribed handlers,
+# so a write handled by one worker evicts the stale entries in all of them.
+#
+# Handlers are `async handler(kind, doc)` where kind is "insert", "update",
+# "minor" (an update that set only the subscription's minor fields),
+# "replace", "delete" or "reset". `doc` holds the subscribed fields of the
+# document after the change, or None. Deletes carry no document, since
+# recording pre-images would double the writes behind every stock update;
+# a subscription with a `key` field remembers that field by `_id` instead,
+# and its deletes carry just `{key: value}` (or None for a document it never
+# saw). "reset" means changes may have been missed and everything cached
+# from the collection must go.
+#
+# The resume token of the last change seen is kept per collection, so a
+# stream that drops is reopened where it stopped. Change streams need a
+# replica set; against a standalone server the feed polls each collection
+# for documents whose `updatedAt` (or other timestamp field) moved, and
+# resets on a drop in the count (deletes leave nothing to poll for, so there
+# every delete is a reset). Polls
+# overlap, so handlers may see the same document more than once.
+
+# $changeStream is only supported on replica sets / unrecognized stage
+UNSUPPORTED = {40573, 40324}
+# The resume token is no longer in the oplog / the stream cannot continue
+HISTORY_LOST = {286, 280}
+
+# Polls re-read this far behind the last timestamp seen, in case another
+# worker's clock is slightly behind
+POLL_OVERLAP = timedelta(seconds=5)
+
+changes_received = registry.register(Counter(
+    "cache_invalidations_total", "Changes received by the change feed, by collection and kind", ("collection", "kind")))
+
+class _Subscription:
+    def __init__(self, collection, fields, changed, minor, poll_field, key):
+        self.collection = collection
+        self.fields = fields
+        self.changed = changed
+        self.minor = minor
+        self.poll_field = poll_field
+        self.key = key
+        self.keys = {}  # _id -> key field, for deletes
+        self.handlers = []
+        self.token = None
+        self.polling = False
+        self.since = None
+
+class ChangeFeed:
+    """Fans out changes to collections of a database to in-process handlers."""
+
+    def __init__(self, poll_interval=5.0, retry_interval=5.0, max_await_ms=1000):
+        self.db = None
+        self.poll_interval = poll_interval
+        self.retry_interval = retry_interval
+        self.max_await_ms = max_await_ms
+        self.subscriptions = {}
+        self._tasks = []
+
+    def subscribe(self, collection, handler, fields=None, changed=None, minor=None, poll_field="updatedAt", key=None):
+        """Call ``handler`` for changes to ``collection``.
+
+        ``fields`` limits the document passed to the handler; ``changed``
+        skips updates that set none of these fields; updates that set only
+        ``minor`` fields are dispatched as "minor". ``poll_field`` is the ISO
+        timestamp polling looks for changes by, so changes that do not set it
+        (minor ones, typically) are not seen while polling. With ``key``,
+        deletes pass ``{key: value}`` of the deleted document.
+        """
+        sub = self.subscriptions.get(collection)
+        if sub is None:
+            sub = self.subscriptions[collection] = _Subscription(collection, fields, changed, minor, poll_field, key)
+        sub.handlers.append(handler)
+
+    async def _dispatch(self, sub, kind, doc):
+        changes_received.inc(sub.collection, kind)
+        for handler in sub.handlers:
+            try:
+                await handler(kind, doc)
+            except Exception:
+                logger.exception("Change feed handler failed for %s %s", sub.collection, kind)
+
+    def _pipeline(self, sub):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        if sub.changed:
+            pipeline.append({"$match": {"$or": [
+                {"operationType": {"$ne": "update"}},
+                *({f"updateDescription.updatedFields.{field}": {"$exists": True}} for field in sub.changed),
+            ]}})
+        if sub.minor:
+            # The names of the updated fields, without their values
+            pipeline.append({"$addFields": {"changedFields": {"$map": {
+                "input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}},
+                "in": "$$this.k",
+            }}}})
+        if sub.fields:
+            # _id is the resume token and must stay
+            projection = {"operationType": 1, "changedFields": 1}
+            for field in sub.fields:
+                projection[f"fullDocument.{field}"] = 1
+            if sub.key:
+                projection.update({"documentKey": 1, "fullDocument._id": 1, f"fullDocument.{sub.key}": 1})
+            pipeline.append({"$project": projection})
+        return pipeline
+
+    async def _load_keys(self, sub):
+        # Documents that existed before the stream opened can be deleted too
+        sub.keys = {}
+        async for doc in self.db[sub.collection].find({}, {"_id": 1, sub.key: 1}):
+            sub.keys[doc["_id"]] = doc.get(sub.key)
+
+    async def _stream(self, sub):
+        if sub.key and sub.token is None:
+            await self._load_keys(sub)
+        options = {"full_document": "updateLookup", "max_await_time_ms": self.max_await_ms}
+        if sub.token is not None:
+            options["resume_after"] = sub.token
+        async with self.db[sub.collection].watch(self._pipeline(sub), **options) as stream:
+            logger.info("Following %s changes%s", sub.collection, " from resume token" if sub.token else "")
+            while True:
+                change = await stream.try_next()
+                # Advances even without changes, so a reopen skips nothing
+                sub.token = stream.resume_token
+                if change is None:
+                    continue
+                kind = change["operationType"]
+                # "reservations.3" for an element pushed onto reservations
+                if kind == "update" and sub.minor and all(
+                    field.split(".")[0] in sub.minor for field in change.get("changedFields") or ()
+                ):
+                    kind = "minor"
+                doc = change.get("fullDocument")
+                if sub.key:
+                    if kind == "delete":
+                        value = sub.keys.pop(change["documentKey"]["_id"], None)
+                        doc = None if value is None else {sub.key: value}
+                    elif doc is not None:
+                        sub.keys[doc.pop("_id")] = doc.get(sub.key)
+                await self._dispatch(sub, kind, doc)
+
+    async def _poll(self, sub):
+        collection = self.db[sub.collection]
+        projection = {"_id": 0}
+        if sub.fields:
+            projection.update({field: 1 for field in sub.fields}, **{sub.poll_field: 1})
+        if sub.since is None:
+            sub.since = datetime.now(timezone.utc).isoformat()
+        count = await collection.estimated_document_count()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            current = await collection.estimated_document_count()
+            if current < count:
+                await self._dispatch(sub, "reset", None)
+            count = current
+            start = (datetime.fromisoformat(sub.since) - POLL_OVERLAP).isoformat()
+            async for doc in collection.find({sub.poll_field: {"$gt": start}}, projection).sort(sub.poll_field, 1):
+                sub.since = max(sub.since, doc[sub.poll_field])
+                await self._dispatch(sub, "update", doc)
+
+    async def _follow(self, sub):
+        while True:
+            try:
+                if sub.polling:
+                    await self._poll(sub)
+                else:
+                    await self._stream(sub)
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code in UNSUPPORTED:
+                    logger.warning("Change streams unavailable for %s (%s); polling every %ss", sub.collection, e, self.poll_interval)
+                    sub.polling = True
+                    continue
+                if e.code in HISTORY_LOST:
+                    logger.warning("Change stream for %s cannot resume (%s); resetting", sub.collection, e)
+                    sub.token = None
+                    await self._dispatch(sub, "reset", None)
+                    continue
+                logger.exception("Change feed for %s failed", sub.collection)
+            except PyMongoError:
+                logger.exception("Change feed for %s failed", sub.collection)
+            await asyncio.sleep(self.retry_interval)
+
+    def start(self, db):
+        self.db = db
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._follow(sub)) for sub in self.subscriptions.values()]
+        logger.info("Started change feed for %s", ", ".join(self.subscriptions))
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,51 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+# Conditional GET for catalog responses. A product's ETag is its id and
+# version; a listing's ETag hashes the ids and versions of the products on
+# the page, so it changes whenever any of them changes or the page's
+# membership does, plus a variant naming the representation (e.g. the
+# selected fields). Only single products send Last-Modified: a listing can
+# change (a product leaving it) without any remaining product being newer.
+
+def product_etag(product):
+    return f'"{product["id"]}.{product.get("version", 0)}"'
+
+def listing_etag(products, variant=""):
+    digest = hashlib.sha1(f"{variant}|".encode())
+    for product in products:
+        digest.update(f'{product["id"]}.{product.get("version", 0)};'.encode())
+    return f'"{digest.hexdigest()}"'
+
+def http_date(iso):
+    moment = datetime.fromisoformat(iso)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc), usegmt=True)
+
+def _opaque(tag):
+    # If-None-Match uses weak comparison
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def not_modified(headers, etag, last_modified=None):
+    """Whether the request's validators match; If-None-Match takes precedence."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [_opaque(tag) for tag in if_none_match.split(",")]
+        return "*" in tags or _opaque(etag) in tags
+    if_modified_since = headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = datetime.fromisoformat(last_modified)
+        if modified.tzinfo is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        # HTTP dates have one-second resolution
+        return modified.replace(microsecond=0) <= since
+    return False
@@ -0,0 +1,83 @@
+import asyncio
+import os
+import logging
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import SecondaryPreferred
+from metrics import CommandMetrics
+
+logger = logging.getLogger(__name__)
+
+# The server rejects maxStalenessSeconds below 90
+MIN_MAX_STALENESS = 90
+
+def _optional_ms(name):
+    value = int(os.environ.get(name, 0))
+    return value or None
+
+class Database:
+    """The MongoDB client, opened and closed by the app lifespan.
+
+    ``primary`` serves writes and the reads that must observe them (auth,
+    carts, orders, stock). ``replica`` serves catalog and admin analytics
+    reads; with secondary reads enabled it prefers secondaries that are at
+    most ``max_staleness`` seconds behind, otherwise it is the primary.
+    """
+
+    def __init__(self, url, name, pool=None, secondary_reads=False, max_staleness=MIN_MAX_STALENESS, warmup=0):
+        if secondary_reads and max_staleness != -1 and max_staleness < MIN_MAX_STALENESS:
+            raise ValueError(f"max_staleness must be at least {MIN_MAX_STALENESS} seconds (or -1 for no bound)")
+        self.url = url
+        self.name = name
+        self.pool = {k: v for k, v in (pool or {}).items() if v is not None}
+        self.secondary_reads = secondary_reads
+        self.max_staleness = max_staleness
+        self.warmup_connections = warmup
+        self.client = None
+        self.primary = None
+        self.replica = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            os.environ['MONGO_URL'],
+            os.environ['DB_NAME'],
+            pool={
+                "maxPoolSize": int(os.environ.get('MONGO_MAX_POOL_SIZE', 100)),
+                "minPoolSize": int(os.environ.get('MONGO_MIN_POOL_SIZE', 0)),
+                "maxIdleTimeMS": _optional_ms('MONGO_MAX_IDLE_TIME_MS'),
+                "connectTimeoutMS": int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', 10000)),
+                "serverSelectionTimeoutMS": int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', 10000)),
+                "socketTimeoutMS": _optional_ms('MONGO_SOCKET_TIMEOUT_MS'),
+                "waitQueueTimeoutMS": _optional_ms('MONGO_WAIT_QUEUE_TIMEOUT_MS'),
+            },
+            secondary_reads=os.environ.get('MONGO_SECONDARY_READS', '0') == '1',
+            max_staleness=int(os.environ.get('MONGO_MAX_STALENESS_SECONDS', MIN_MAX_STALENESS)),
+            warmup=int(os.environ.get('MONGO_WARMUP_CONNECTIONS', 0)),
+        )
+
+    def connect(self):
+        self.client = AsyncIOMotorClient(self.url, event_listeners=[CommandMetrics()], **self.pool)
+        self.primary = self.client[self.name]
+        if self.secondary_reads:
+            preference = SecondaryPreferred(max_staleness=self.max_staleness)
+            self.replica = self.client.get_database(self.name, read_preference=preference)
+        else:
+            self.replica = self.primary
+        return self
+
+    async def warmup(self):
+        # Fail fast if the deployment is unreachable, then open connections
+        # up front so the first requests do not pay for the handshakes
+        await self.client.admin.command("ping")
+        if self.warmup_connections > 1:
+            await asyncio.gather(*(self.client.admin.command("ping") for _ in range(self.warmup_connections)))
+        logger.info(
+            "Connected to MongoDB (pool %s, secondary reads %s)",
+            self.pool.get("maxPoolSize", 100),
+            f"on, max staleness {self.max_staleness}s" if self.secondary_reads else "off",
+        )
+
+    def close(self):
+        if self.client:
+            self.client.close()
+            self.client = None
@@ -0,0 +1,96 @@
+import csv
+import io
+import json
+from datetime import timezone
+
+# What each export covers: the date field it filters and sorts on, fields to
+# leave out, and the CSV column order.
+EXPORTS = {
+    "orders": {
+        "date_field": "orderDate",
+        "sort": [("orderDate", 1), ("orderId", 1)],
+        "exclude": [],
+        "columns": [
+            "orderId", "userId", "status", "subtotal", "shipping", "total", "paymentMethod",
+            "upiTransactionId", "orderDate", "expectedDelivery", "items", "shippingAddress",
+        ],
+    },
+    "users": {
+        "date_field": "createdAt",
+        "sort": [("createdAt", 1), ("id", 1)],
+        "exclude": ["password"],
+        "columns": ["id", "name", "email", "role", "createdAt"],
+    },
+    "products": {
+        "date_field": "dateAdded",
+        "sort": [("dateAdded", 1), ("id", 1)],
+        "exclude": ["reservations"],
+        "columns": [
+            "id", "sku", "name", "category", "fragrance", "price", "originalPrice", "size", "weight",
+            "burnTime", "stock", "rating", "reviews", "featured", "dateAdded", "images", "description",
+        ],
+    },
+}
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+def _iso(moment):
+    # Stored dates are UTC isoformat strings, so compare in the same form
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat()
+
+def export_cursor(storage, collection, since=None, until=None, batch_size=1000):
+    spec = EXPORTS[collection]
+    return storage.stream(
+        collection, spec["date_field"], spec["sort"], spec["exclude"],
+        since=_iso(since) if since else None,
+        until=_iso(until) if until else None,
+        batch_size=batch_size,
+    )
+
+async def ndjson_lines(cursor):
+    async for doc in cursor:
+        yield json.dumps(doc, default=str, separators=(",", ":")) + "\n"
+
+def _cell(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, default=str, separators=(",", ":"))
+    return "" if value is None else value
+
+async def csv_lines(cursor, columns):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+    async for doc in cursor:
+        writer.writerow([_cell(doc.get(column)) for column in columns])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+
+async def chunked(lines, chunk_size=64 * 1024):
+    # Group small lines into larger writes; the generator is only resumed when
+    # the client has taken the previous chunk, so memory stays bounded.
+    parts, size = [], 0
+    async for line in lines:
+        parts.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(parts)
+            parts, size = [], 0
+    if parts:
+        yield "".join(parts)
+
+def export_stream(storage, collection, fmt, since=None, until=None, batch_size=1000):
+    cursor = export_cursor(storage, collection, since, until, batch_size)
+    if fmt == "csv":
+        lines = csv_lines(cursor, EXPORTS[collection]["columns"])
+    else:
+        lines = ndjson_lines(cursor)
+    return chunked(lines)
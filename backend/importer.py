@@ -0,0 +1,145 @@
+import codecs
+import csv
+import json
+from pydantic import ValidationError
+
+# Streaming counterpart of export.py: rows are parsed from the request body as
+# it arrives, validated one at a time and written in unordered batches, so
+# memory stays bounded by the batch size whatever the file size.
+
+MAX_REPORTED_ERRORS = 1000
+
+# CSV cells holding lists; export.py writes them as JSON, "|" also works
+LIST_COLUMNS = ("images",)
+
+async def _lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def ndjson_rows(chunks):
+    # Yields (line number, row dict or None, error message or None)
+    number = 0
+    async for line in _lines(chunks):
+        number += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"Invalid JSON: {e}"
+            continue
+        if not isinstance(row, dict):
+            yield number, None, "Row must be a JSON object"
+            continue
+        yield number, row, None
+
+def _csv_value(column, value):
+    if column in LIST_COLUMNS:
+        if value.startswith("["):
+            return json.loads(value)
+        return [part for part in value.split("|") if part]
+    return value
+
+async def csv_rows(chunks):
+    # A record ends at a newline outside quotes, so quoted cells may span lines
+    header, record, start, number = None, [], 0, 0
+    async for line in _lines(chunks):
+        number += 1
+        if not record:
+            start = number
+        record.append(line)
+        text = "\n".join(record)
+        if text.count('"') % 2:
+            continue
+        record = []
+        if not text.strip():
+            continue
+        try:
+            [cells] = list(csv.reader([text]))
+        except (csv.Error, ValueError) as e:
+            yield start, None, f"Invalid CSV: {e}"
+            continue
+        if header is None:
+            header = [cell.strip() for cell in cells]
+            continue
+        if len(cells) != len(header):
+            yield start, None, f"Expected {len(header)} columns, got {len(cells)}"
+            continue
+        try:
+            row = {column: _csv_value(column, value) for column, value in zip(header, cells) if value != ""}
+        except ValueError as e:
+            yield start, None, f"Invalid list value: {e}"
+            continue
+        yield start, row, None
+
+def _describe(error):
+    if isinstance(error, ValidationError):
+        return [{"loc": ".".join(str(part) for part in e["loc"]), "msg": e["msg"]} for e in error.errors()]
+    return [{"loc": "", "msg": str(error)}]
+
+class ImportReport:
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.errors = []
+
+    def error(self, row, details):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row, "errors": details})
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errorsTruncated": self.failed > len(self.errors),
+        }
+
+async def import_products(products, chunks, fmt, to_document, batch_size=1000):
+    """Validate rows with ``to_document(row)`` and upsert them by SKU.
+
+    ``to_document`` returns the product document to store or raises
+    ``ValidationError``/``ValueError`` for the row.
+    """
+    report = ImportReport()
+    batch, batch_rows = [], []
+
+    async def flush():
+        inserted, updated, failures = await products.upsert_many(batch)
+        report.inserted += inserted
+        report.updated += updated
+        for index, message in failures.items():
+            report.error(batch_rows[index], [{"loc": "", "msg": message}])
+        batch.clear()
+        batch_rows.clear()
+
+    rows = csv_rows(chunks) if fmt == "csv" else ndjson_rows(chunks)
+    async for number, row, problem in rows:
+        report.received += 1
+        if problem:
+            report.error(number, [{"loc": "", "msg": problem}])
+            continue
+        try:
+            batch.append(to_document(row))
+        except (ValidationError, ValueError) as e:
+            report.error(number, _describe(e))
+            continue
+        batch_rows.append(number)
+        if len(batch) >= batch_size:
+            await flush()
+    if batch:
+        await flush()
+    return report
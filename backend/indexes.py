@@ -0,0 +1,146 @@
+import asyncio
+import os
+import sys
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pagination import PRODUCT_SORT, ORDER_SORT, USER_SORT
+
+logger = logging.getLogger(__name__)
+
+# Every index the API relies on, per collection. Names are fixed so that
+# create_indexes() is a no-op when the index already exists.
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        IndexModel([("createdAt", DESCENDING), ("id", DESCENDING)], name="createdAt_id"),
+        # Change feed polling fallback; only users that were ever updated have it
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt", sparse=True),
+    ],
+    "products": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # Imports upsert by SKU, so two products must never share one
+        IndexModel([("sku", ASCENDING)], name="sku_unique", unique=True),
+        IndexModel([("category", ASCENDING), ("price", ASCENDING)], name="category_price"),
+        IndexModel([("price", ASCENDING)], name="price"),
+        # Keyset pagination: newest first, optionally within one filter value
+        IndexModel([("dateAdded", DESCENDING), ("id", DESCENDING)], name="dateAdded_id"),
+        IndexModel([("category", ASCENDING), ("dateAdded", DESCENDING), ("id", DESCENDING)], name="category_dateAdded_id"),
+        IndexModel([("fragrance", ASCENDING), ("dateAdded", DESCENDING), ("id", DESCENDING)], name="fragrance_dateAdded_id"),
+        IndexModel([("featured", ASCENDING), ("dateAdded", DESCENDING), ("id", DESCENDING)], name="featured_dateAdded_id"),
+        IndexModel([("updatedAt", ASCENDING)], name="updatedAt"),
+    ],
+    "orders": [
+        IndexModel([("orderId", ASCENDING)], name="orderId_unique", unique=True),
+        IndexModel([("userId", ASCENDING), ("orderDate", DESCENDING), ("orderId", DESCENDING)], name="userId_orderDate_orderId"),
+        IndexModel([("orderDate", DESCENDING), ("orderId", DESCENDING)], name="orderDate_orderId"),
+    ],
+    "carts": [
+        IndexModel([("userId", ASCENDING)], name="userId_unique", unique=True),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("runAt", ASCENDING)], name="runAt"),
+    ],
+    "reservations": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("expiresAt", ASCENDING)], name="expiresAt"),
+    ],
+}
+
+# Indexes replaced by one on the same keys, which cannot coexist with them;
+# dropped before the replacement is created
+RETIRED_INDEXES = {
+    "products": ["sku"],
+}
+
+# The query shape behind each hot endpoint: (endpoint, collection, filter, sort).
+# Values are placeholders; only the shape matters to the planner.
+HOT_QUERIES = [
+    ("get_current_user", "users", {"id": "probe"}, None),
+    ("login/register", "users", {"email": "probe@example.com"}, None),
+    ("get_users", "users", {}, USER_SORT),
+    ("get_product", "products", {"id": "probe"}, None),
+    ("get_products", "products", {}, PRODUCT_SORT),
+    ("get_products?category", "products", {"category": "probe", "price": {"$gte": 0, "$lte": 1000}}, PRODUCT_SORT),
+    ("get_products?fragrance", "products", {"fragrance": "probe"}, PRODUCT_SORT),
+    ("get_products?featured", "products", {"featured": True}, PRODUCT_SORT),
+    ("get_products?price", "products", {"price": {"$gte": 0}}, PRODUCT_SORT),
+    # Search ranks in memory, then reads the candidates by id
+    ("get_products?search", "products", {"id": {"$in": ["probe", "probe2"]}}, PRODUCT_SORT),
+    ("get_related_products, create_order", "products", {"id": {"$in": ["probe", "probe2"]}}, None),
+    ("get_cart", "carts", {"userId": "probe"}, None),
+    ("change feed polling", "products", {"updatedAt": {"$gt": "probe"}}, [("updatedAt", 1)]),
+    ("change feed polling", "users", {"updatedAt": {"$gt": "probe"}}, [("updatedAt", 1)]),
+    ("change feed polling", "orders", {"orderDate": {"$gt": "probe"}}, [("orderDate", 1)]),
+    ("claim jobs", "jobs", {"runAt": {"$lte": "probe"}}, [("runAt", 1)]),
+    ("claim jobs", "jobs", {"id": {"$in": ["probe", "probe2"]}, "claim": "probe"}, None),
+    ("claim reservation", "reservations", {"id": "probe", "userId": "probe", "expiresAt": {"$gt": "probe"}, "expired": {"$ne": True}}, None),
+    ("expired reservations", "reservations", {"expiresAt": {"$lte": "probe"}}, [("expiresAt", 1)]),
+    ("get_order", "orders", {"orderId": "probe", "userId": "probe"}, None),
+    ("get_orders", "orders", {"userId": "probe"}, ORDER_SORT),
+    ("get_orders (admin), get_dashboard_stats", "orders", {}, ORDER_SORT),
+]
+
+class QueryPlanError(Exception):
+    pass
+
+async def ensure_indexes(db):
+    for collection, indexes in INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in RETIRED_INDEXES.get(collection, ()):
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info("Dropped retired index %s on %s", name, collection)
+        names = await db[collection].create_indexes(indexes)
+        logger.info("Ensured indexes on %s: %s", collection, ", ".join(names))
+
+def _plan_stages(plan):
+    if not isinstance(plan, dict):
+        return
+    if "stage" in plan:
+        yield plan["stage"]
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def explain_query(db, collection, query, sort=None):
+    cursor = db[collection].find(query)
+    if sort:
+        cursor = cursor.sort(sort)
+    explain = await cursor.explain()
+    return explain["queryPlanner"]["winningPlan"]
+
+async def verify_query_plans(db):
+    failures = []
+    for endpoint, collection, query, sort in HOT_QUERIES:
+        stages = list(_plan_stages(await explain_query(db, collection, query, sort)))
+        if "COLLSCAN" in stages:
+            failures.append(f"{endpoint}: {collection}.find({query}) -> {' <- '.join(stages)}")
+    if failures:
+        raise QueryPlanError("Hot queries fall back to COLLSCAN:\n  " + "\n  ".join(failures))
+    return len(HOT_QUERIES)
+
+async def main():
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'test_database')]
+    try:
+        await ensure_indexes(db)
+        checked = await verify_query_plans(db)
+        print(f"All {checked} hot queries are served by an index")
+    except QueryPlanError as e:
+        print(e)
+        return 1
+    finally:
+        client.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
@@ -1,24 +1,40 @@
 import asyncio
+import argparse
+import bisect
+import itertools
+import random
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
 from passlib.context import CryptContext
 import os
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import uuid
+from indexes import ensure_indexes
+from stats import rebuild_stats
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-async def init_database():
+async def init_database(scale=None):
     mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
     db_name = os.environ.get('DB_NAME', 'test_database')
     
     client = AsyncIOMotorClient(mongo_url)
     db = client[db_name]
     
-    # Clear existing data
-    await db.users.delete_many({})
-    await db.products.delete_many({})
-    await db.orders.delete_many({})
-    await db.carts.delete_many({})
+    # Clear existing data, including queued jobs and stock reservations: left
+    # over from the previous dataset, they would change the new counters
+    if scale:
+        # Dropping is much faster than deleting millions of documents; indexes
+        # are rebuilt after the bulk load below
+        for collection in ("users", "products", "orders", "carts", "jobs", "reservations"):
+            await db[collection].drop()
+    else:
+        await db.users.delete_many({})
+        await db.products.delete_many({})
+        await db.orders.delete_many({})
+        await db.carts.delete_many({})
+        await db.jobs.delete_many({})
+        await db.reservations.delete_many({})
     
     # Create admin user
     admin_id = str(uuid.uuid4())
@@ -447,14 +463,206 @@ async def init_database():
         }
     ]
     
+    for product in products:
+        product.update(version=1, updatedAt=product["dateAdded"])
     await db.products.insert_many(products)
+    if scale:
+        await seed_at_scale(db, scale, products)
+    await ensure_indexes(db)
+    await rebuild_stats(db)
     
     print(f"Database initialized successfully!")
-    print(f"Created {len(products)} products")
+    print(f"Created {len(products) + (scale.products if scale else 0)} products")
     print(f"Admin credentials: admin@candles.com / admin123")
     print(f"User credentials: user@candles.com / user123")
     
     client.close()
 
+# Synthetic data for production-sized testing (python init_db.py --scale ...)
+CATEGORY_WEIGHTS = {"Scented": 0.55, "Unscented": 0.15, "Decorative": 0.2, "Eco-Friendly": 0.1}
+FRAGRANCES = ["Lavender", "Vanilla", "Rose", "Sandalwood", "Citrus", "Cinnamon", "Ocean Breeze",
+              "Jasmine", "Amber", "Mint", "Cedarwood", "Coconut", "Pine", "Honey", "Peony", "Bergamot"]
+NAME_WORDS = ["Dreams", "Bliss", "Glow", "Garden", "Haven", "Whisper", "Serenity", "Ember", "Harvest",
+              "Nights", "Morning", "Cozy", "Escape", "Retreat", "Ritual", "Meadow", "Breeze", "Velvet"]
+SIZES = [("4 oz", "113g", "20-25 hours"), ("8 oz", "227g", "40-45 hours"), ("12 oz", "340g", "60-70 hours")]
+# Relative order volume per month (Jan..Dec): festive season peaks in Oct-Dec
+MONTH_WEIGHTS = [0.8, 0.7, 0.8, 0.8, 0.9, 0.9, 0.9, 1.0, 1.1, 1.6, 1.8, 1.7]
+SHIPPING_FEE = 50.0
+ZIPF_EXPONENT = 1.1
+HISTORY_DAYS = 730
+
+def generate_product(rng, i, now):
+    category = rng.choices(list(CATEGORY_WEIGHTS), weights=list(CATEGORY_WEIGHTS.values()))[0]
+    fragrance = None if category == "Unscented" else rng.choice(FRAGRANCES)
+    size, weight, burn_time = rng.choice(SIZES)
+    product_id = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    price = float(round(rng.lognormvariate(6.5, 0.4) / 10) * 10 - 1)
+    date_added = (now - timedelta(days=rng.randint(0, HISTORY_DAYS), seconds=rng.randint(0, 86399))).isoformat()
+    return {
+        "id": product_id,
+        "name": f"{fragrance or 'Pure'} {rng.choice(NAME_WORDS)} {i}",
+        "price": price,
+        "originalPrice": float(round(price * 1.25)) if rng.random() < 0.3 else None,
+        "category": category,
+        "fragrance": fragrance,
+        "size": size,
+        "weight": weight,
+        "burnTime": burn_time,
+        "stock": rng.randint(0, 200),
+        "images": [f"https://images.example.com/products/{product_id}-{n}.jpg" for n in range(rng.randint(1, 3))],
+        "description": f"Hand-poured {category.lower()} candle" + (f" with notes of {fragrance.lower()}." if fragrance else "."),
+        "rating": round(min(5.0, rng.gauss(4.4, 0.3)), 1),
+        "reviews": int(rng.paretovariate(1.5)) * 5,
+        "sku": f"{category[:3].upper()}-{product_id[:8].upper()}",
+        "featured": rng.random() < 0.03,
+        "dateAdded": date_added,
+        "version": 1,
+        "updatedAt": date_added,
+    }
+
+def generate_user(rng, i, password_hash, now):
+    return {
+        "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+        "name": f"Customer {i}",
+        "email": f"customer{i}@example.com",
+        "password": password_hash,
+        "role": "user",
+        "createdAt": (now - timedelta(days=rng.randint(0, HISTORY_DAYS), seconds=rng.randint(0, 86399))).isoformat(),
+    }
+
+class OrderGenerator:
+    """Orders with Zipf-distributed product popularity and seasonal dates."""
+
+    def __init__(self, rng, products, user_ids, now):
+        self.rng = rng
+        self.products = products
+        self.user_ids = user_ids
+        self.now = now
+        # Product at rank r is picked with probability proportional to 1 / r^s
+        self.product_weights = list(itertools.accumulate(1 / (rank ** ZIPF_EXPONENT) for rank in range(1, len(products) + 1)))
+        days = [now - timedelta(days=d) for d in range(HISTORY_DAYS)]
+        self.days = days
+        self.day_weights = list(itertools.accumulate(MONTH_WEIGHTS[day.month - 1] for day in days))
+
+    def pick_products(self, k):
+        total = self.product_weights[-1]
+        return [self.products[bisect.bisect_left(self.product_weights, self.rng.random() * total)] for _ in range(k)]
+
+    def order_date(self):
+        total = self.day_weights[-1]
+        day = self.days[bisect.bisect_left(self.day_weights, self.rng.random() * total)]
+        return day.replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(seconds=self.rng.randint(0, 86399))
+
+    def status(self, age_days):
+        if age_days > 14:
+            return "cancelled" if self.rng.random() < 0.05 else "delivered"
+        return self.rng.choices(["pending", "processing", "shipped", "cancelled"], weights=[0.4, 0.3, 0.25, 0.05])[0]
+
+    def order(self):
+        rng = self.rng
+        lines = {}
+        for product in self.pick_products(min(1 + int(rng.expovariate(0.8)), 8)):
+            lines.setdefault(product["id"], [product, 0])[1] += rng.randint(1, 2)
+        items = [
+            {"productId": p["id"], "name": p["name"], "price": p["price"], "quantity": qty, "image": p["images"][0] if p["images"] else ""}
+            for p, qty in lines.values()
+        ]
+        subtotal = round(sum(item["price"] * item["quantity"] for item in items), 2)
+        ordered_at = self.order_date()
+        return {
+            "orderId": f"ORD-{ordered_at.strftime('%Y%m%d')}-{uuid.UUID(int=rng.getrandbits(128)).hex[:8].upper()}",
+            "userId": rng.choice(self.user_ids),
+            "items": items,
+            "subtotal": subtotal,
+            "shipping": SHIPPING_FEE,
+            "total": round(subtotal + SHIPPING_FEE, 2),
+            "status": self.status((self.now - ordered_at).days),
+            "shippingAddress": {
+                "fullName": "Synthetic Customer", "email": "customer@example.com", "phone": "9000000000",
+                "addressLine1": f"{rng.randint(1, 999)} Market Road", "addressLine2": None,
+                "city": rng.choice(["Mumbai", "Pune", "Delhi", "Bengaluru", "Chennai", "Kolkata"]),
+                "state": "MH", "pinCode": f"{rng.randint(110000, 699999)}",
+            },
+            "paymentMethod": "UPI",
+            "upiTransactionId": f"UPI-{uuid.UUID(int=rng.getrandbits(128)).hex[:12].upper()}",
+            "orderDate": ordered_at.isoformat(),
+            "expectedDelivery": (ordered_at + timedelta(days=7)).isoformat(),
+        }
+
+    def cart(self, user_id):
+        products = self.pick_products(self.rng.randint(1, 4))
+        return {
+            "userId": user_id,
+            "items": [{"productId": p["id"], "quantity": self.rng.randint(1, 3)} for p in {p["id"]: p for p in products}.values()],
+            "updatedAt": (self.now - timedelta(minutes=self.rng.randint(0, 60 * 24 * 30))).isoformat(),
+        }
+
+async def bulk_insert(collection, documents, batch_size, concurrency):
+    """Insert an iterable of documents in unordered batches, several in flight at once."""
+    slots = asyncio.Semaphore(concurrency)
+    tasks = set()
+    count = 0
+    started = time.perf_counter()
+
+    async def insert(batch):
+        try:
+            await collection.insert_many(batch, ordered=False)
+        finally:
+            slots.release()
+
+    iterator = iter(documents)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        await slots.acquire()
+        task = asyncio.create_task(insert(batch))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+        count += len(batch)
+    await asyncio.gather(*tasks)
+
+    elapsed = time.perf_counter() - started
+    print(f"  {collection.name:<9} {count:>10,} docs in {elapsed:7.2f}s ({count / max(elapsed, 1e-9):>10,.0f} docs/s)")
+    return count
+
+async def seed_at_scale(db, scale, base_products):
+    rng = random.Random(scale.seed)
+    now = datetime.now(timezone.utc)
+    print(f"Generating {scale.products:,} products, {scale.users:,} users, {scale.orders:,} orders, {scale.carts:,} carts")
+
+    # Hash once and share it: bcrypt per synthetic user would take hours
+    password_hash = pwd_context.hash("user123")
+
+    products = [generate_product(rng, i, now) for i in range(scale.products)]
+    await bulk_insert(db.products, products, scale.batch_size, scale.concurrency)
+    # Keep only what orders need, in a random popularity order
+    catalog = [{k: p[k] for k in ("id", "name", "price", "images")} for p in products + base_products]
+    del products
+    rng.shuffle(catalog)
+
+    user_ids = []
+    def users():
+        for i in range(scale.users):
+            user = generate_user(rng, i, password_hash, now)
+            user_ids.append(user["id"])
+            yield user
+    await bulk_insert(db.users, users(), scale.batch_size, scale.concurrency)
+    if not user_ids:
+        return
+
+    generator = OrderGenerator(rng, catalog, user_ids, now)
+    await bulk_insert(db.orders, (generator.order() for _ in range(scale.orders)), scale.batch_size, scale.concurrency)
+    cart_owners = rng.sample(user_ids, min(scale.carts, len(user_ids)))
+    await bulk_insert(db.carts, (generator.cart(user_id) for user_id in cart_owners), scale.batch_size, scale.concurrency)
+    print("Synthetic customers log in as customer<N>@example.com / user123")
+
 if __name__ == "__main__":
-    asyncio.run(init_database())
+    parser = argparse.ArgumentParser(description="Reset the database with demo data")
+    parser.add_argument("--scale", action="store_true", help="also generate production-sized synthetic data")
+    parser.add_argument("--products", type=int, default=10000)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--orders", type=int, default=500000)
+    parser.add_argument("--carts", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for reproducible data")
+    args = parser.parse_args()
+    asyncio.run(init_database(args if args.scale else None))
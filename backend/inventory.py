@@ -0,0 +1,125 @@
+import asyncio
+import logging
+from datetime import datetime, timezone, timedelta
+
+logger = logging.getLogger(__name__)
+
+# Stock is taken when checkout starts and handed back if the order is never
+# placed. A reservation is a document {id, userId, lines, expiresAt}; the
+# products it holds stock on carry its id in their `reservations` array, so
+# taking, returning and settling stock are all idempotent per product.
+#
+# The reservation id doubles as the order id. Expired reservations whose
+# order exists are settled rather than released, so a crash between placing
+# the order and committing the reservation never hands the stock back; the
+# order's other side effects are handed to `recover`, since the commit job is
+# queued after them and a reservation left behind means they may be lost. The
+# sweep leases a reservation before touching stock and deletes it only after,
+# so a crash in between leaves it to be swept again once the lease ends.
+
+class OutOfStock(Exception):
+    def __init__(self, product_ids):
+        super().__init__("Insufficient stock")
+        self.product_ids = product_ids
+
+class ReservationNotFound(Exception):
+    pass
+
+def _now():
+    return datetime.now(timezone.utc)
+
+def merge_lines(items):
+    # {productId: total quantity}; the same product may appear on several lines
+    lines = {}
+    for item in items:
+        lines[item["productId"]] = lines.get(item["productId"], 0) + item["quantity"]
+    return lines
+
+def reservation_lines(reservation):
+    return {line["productId"]: line["quantity"] for line in reservation["lines"]}
+
+class Inventory:
+    """Reserves, commits and releases stock through the storage repositories."""
+
+    def __init__(self, storage, ttl=900, lease=60, recover=None, stock_changed=None):
+        self.storage = storage
+        self.ttl = ttl
+        self.lease = lease
+        self.recover = recover
+        # Called with the product ids whenever stock is taken or returned
+        self.stock_changed = stock_changed or (lambda product_ids: None)
+        self._sweeper = None
+
+    async def reserve(self, reservation_id, user_id, lines):
+        reservation = {
+            "id": reservation_id,
+            "userId": user_id,
+            "lines": [{"productId": pid, "quantity": qty} for pid, qty in lines.items()],
+            "expiresAt": (_now() + timedelta(seconds=self.ttl)).isoformat(),
+        }
+        # Recorded before stock is taken so a crash in between is swept up
+        await self.storage.reservations.insert(reservation)
+        short = await self.storage.products.reserve_stock(reservation_id, lines)
+        self.stock_changed(list(lines))
+        if short:
+            await self.storage.reservations.delete(reservation_id)
+            raise OutOfStock(short)
+        return reservation
+
+    async def claim(self, reservation_id, user_id):
+        # Extends the reservation by `lease` seconds while its order is placed;
+        # fails if it already expired, so the sweeper and checkout never both win
+        now = _now()
+        reservation = await self.storage.reservations.claim(
+            reservation_id, user_id, now.isoformat(), (now + timedelta(seconds=self.lease)).isoformat()
+        )
+        if reservation is None:
+            raise ReservationNotFound("Reservation not found or expired")
+        return reservation
+
+    async def commit(self, reservation):
+        await self.storage.products.settle_stock(reservation["id"], reservation_lines(reservation))
+        await self.storage.reservations.delete(reservation["id"])
+
+    async def release(self, reservation):
+        lines = reservation_lines(reservation)
+        await self.storage.products.release_stock(reservation["id"], lines)
+        self.stock_changed(list(lines))
+        await self.storage.reservations.delete(reservation["id"])
+
+    async def release_expired(self):
+        released = 0
+        now = _now()
+        until = (now + timedelta(seconds=self.lease)).isoformat()
+        while True:
+            reservation = await self.storage.reservations.lease_expired(now.isoformat(), until)
+            if reservation is None:
+                return released
+            lines = reservation_lines(reservation)
+            order = await self.storage.orders.get(reservation["id"])
+            if order:
+                await self.storage.products.settle_stock(reservation["id"], lines)
+                if self.recover:
+                    await self.recover(order)
+            else:
+                await self.storage.products.release_stock(reservation["id"], lines)
+                self.stock_changed(list(lines))
+                released += 1
+            await self.storage.reservations.delete(reservation["id"])
+
+    async def _sweep(self, interval):
+        while True:
+            try:
+                released = await self.release_expired()
+                if released:
+                    logger.info("Released %d expired stock reservations", released)
+            except Exception:
+                logger.exception("Stock reservation sweep failed")
+            await asyncio.sleep(interval)
+
+    def start(self, interval=30):
+        self._sweeper = asyncio.get_running_loop().create_task(self._sweep(interval))
+
+    def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from metrics import registry, Counter
+
+logger = logging.getLogger(__name__)
+
+# Durable background jobs for work that must happen but not before the
+# response: {id, kind, payload, status, attempts, runAt, createdAt}. A job is
+# due once `runAt` has passed. Claiming a job moves `runAt` forward by the
+# lease, so a job held by a worker that died is picked up again afterwards.
+# Finished jobs are deleted; jobs out of attempts are kept with status "dead".
+# Handlers get a batch of payloads of one kind and must be idempotent.
+
+jobs_processed = registry.register(Counter(
+    "jobs_processed_total", "Background jobs completed by kind", ("kind",)))
+jobs_failed = registry.register(Counter(
+    "jobs_failed_total", "Background job attempts that raised, by kind", ("kind",)))
+
+def _now():
+    return datetime.now(timezone.utc)
+
+class JobQueue:
+    """Runs registered handlers for queued jobs on worker tasks in the app's loop."""
+
+    def __init__(self, storage, workers=2, batch_size=100, poll_interval=1.0, lease=60, max_attempts=5, backoff=1.0):
+        self.storage = storage
+        self.workers = workers
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.handlers = {}
+        self._tasks = []
+        self._wake = asyncio.Event()
+
+    def handler(self, kind):
+        def register(fn):
+            self.handlers[kind] = fn
+            return fn
+        return register
+
+    async def enqueue_many(self, jobs):
+        now = _now().isoformat()
+        await self.storage.jobs.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "kind": kind,
+                "payload": payload,
+                "status": "pending",
+                "attempts": 0,
+                "runAt": now,
+                "createdAt": now,
+            }
+            for kind, payload in jobs
+        ])
+        self._wake.set()
+
+    async def enqueue(self, kind, payload):
+        await self.enqueue_many([(kind, payload)])
+
+    async def run_once(self):
+        now = _now()
+        jobs = await self.storage.jobs.claim(
+            now.isoformat(), (now + timedelta(seconds=self.lease)).isoformat(), self.batch_size, uuid.uuid4().hex
+        )
+        batches = defaultdict(list)
+        for job in jobs:
+            batches[job["kind"]].append(job)
+        for kind, batch in batches.items():
+            try:
+                handler = self.handlers.get(kind)
+                if handler is None:
+                    raise LookupError(f"No handler for job kind {kind!r}")
+                await handler([job["payload"] for job in batch])
+            except Exception as e:
+                logger.exception("Background job batch failed: %d %s job(s)", len(batch), kind)
+                jobs_failed.inc(kind, amount=len(batch))
+                await self._failed(batch, e)
+            else:
+                await self.storage.jobs.complete([job["id"] for job in batch])
+                jobs_processed.inc(kind, amount=len(batch))
+        return len(jobs)
+
+    async def _failed(self, batch, error):
+        for job in batch:
+            if job["attempts"] >= self.max_attempts:
+                await self.storage.jobs.bury(job["id"], repr(error))
+            else:
+                delay = min(self.backoff * 2 ** (job["attempts"] - 1), 300)
+                await self.storage.jobs.retry(job["id"], (_now() + timedelta(seconds=delay)).isoformat(), repr(error))
+
+    async def _work(self):
+        while True:
+            try:
+                processed = await self.run_once()
+            except Exception:
+                logger.exception("Background job worker failed to claim jobs")
+                processed = 0
+            if not processed:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def start(self):
+        self._tasks = [asyncio.get_running_loop().create_task(self._work()) for _ in range(self.workers)]
+        logger.info("Started %d background job workers", self.workers)
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
@@ -0,0 +1,26 @@
+class ProductLoader:
+    """Resolves products by id in batches, remembering results for one request.
+
+    Every ``load_many`` call costs at most one ``$in`` query, and ids already
+    seen during the request are not fetched again.
+    """
+
+    def __init__(self, products):
+        self.products = products
+        self._products = {}
+
+    async def load_many(self, product_ids):
+        missing = [pid for pid in dict.fromkeys(product_ids) if pid not in self._products]
+        if missing:
+            found = await self.products.get_many(missing)
+            for product in found:
+                self._products[product["id"]] = product
+            for pid in missing:
+                self._products.setdefault(pid, None)
+        return [self._products[pid] for pid in product_ids]
+
+    async def load(self, product_id):
+        return (await self.load_many([product_id]))[0]
+
+    def prime(self, product):
+        self._products[product["id"]] = product
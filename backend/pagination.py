@@ -0,0 +1,66 @@
+import json
+import base64
+import binascii
+
+MAX_PAGE_SIZE = 200
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Listing sort orders; the last field is unique so every position is well defined
+PRODUCT_SORT = [("dateAdded", -1), ("id", -1)]
+ORDER_SORT = [("orderDate", -1), ("orderId", -1)]
+USER_SORT = [("createdAt", -1), ("id", -1)]
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(values):
+    raw = json.dumps(values, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor, fields=None):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (binascii.Error, ValueError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(values, dict) or not all(isinstance(v, (str, int, float)) for v in values.values()):
+        raise InvalidCursor("Malformed cursor")
+    if fields is not None and set(values) != set(fields):
+        raise InvalidCursor("Cursor does not belong to this listing")
+    return values
+
+def decode_offset_cursor(cursor):
+    # Used for listings ordered in memory (e.g. search relevance)
+    if not cursor:
+        return 0
+    offset = decode_cursor(cursor, ["offset"])["offset"]
+    if not isinstance(offset, int) or offset < 0:
+        raise InvalidCursor("Malformed cursor")
+    return offset
+
+def encode_offset_cursor(offset):
+    return encode_cursor({"offset": offset})
+
+def cursor_after(doc, sort):
+    return encode_cursor({field: doc[field] for field, _ in sort})
+
+def keyset_filter(values, sort):
+    # Everything strictly after `values` in `sort` order:
+    # (a > x) or (a == x and b > y) or ...
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        clause = {f: values[f] for f, _ in sort[:i]}
+        clause[field] = {"$lt" if direction < 0 else "$gt": values[field]}
+        clauses.append(clause)
+    return {"$or": clauses}
+
+def decode_keyset_cursor(cursor, sort):
+    # The sort values of the last row of the previous page, or None
+    if not cursor:
+        return None
+    return decode_cursor(cursor, [field for field, _ in sort])
+
+def next_cursor(page, limit, sort):
+    if len(page) < limit:
+        return None
+    return cursor_after(page[-1], sort)
@@ -0,0 +1,124 @@
+import os
+import sys
+import time
+import logging
+import threading
+import traceback
+from collections import Counter as Tally
+from metrics import registry, Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 60
+
+loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "Delay between when a loop heartbeat was due and when it ran",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)))
+loop_stalls = registry.register(Counter(
+    "event_loop_stalls_total", "Heartbeats delayed by more than the stall threshold"))
+
+class LoopMonitor:
+    """Detects event-loop stalls and logs the stack that is blocking the loop.
+
+    A heartbeat callback runs on the loop every ``interval`` seconds. A
+    watchdog thread checks that it keeps running; once it is more than
+    ``threshold`` seconds late, the watchdog grabs the loop thread's current
+    stack, which is the synchronous code holding the loop.
+    """
+
+    def __init__(self, threshold=0.1, interval=0.05):
+        self.threshold = threshold
+        self.interval = interval
+        self.loop = None
+        self.loop_thread_id = None
+        self._due = 0.0
+        self._last_beat = 0.0
+        self._reported_beat = None
+        self._handle = None
+        self._stop = threading.Event()
+        self._watchdog = None
+
+    def start(self, loop):
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self._stop.clear()
+        self._last_beat = time.monotonic()
+        self._schedule()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        logger.info("Event loop monitor started (stall threshold %.0fms)", self.threshold * 1000)
+
+    def stop(self):
+        self._stop.set()
+        if self._handle:
+            self._handle.cancel()
+
+    def _schedule(self):
+        self._due = time.monotonic() + self.interval
+        self._handle = self.loop.call_later(self.interval, self._beat)
+
+    def _beat(self):
+        now = time.monotonic()
+        lag = max(0.0, now - self._due)
+        self._last_beat = now
+        loop_lag.observe(lag)
+        if lag > self.threshold:
+            loop_stalls.inc()
+            logger.warning("Event loop was blocked for %.0fms", lag * 1000)
+        if not self._stop.is_set():
+            self._schedule()
+
+    def _watch(self):
+        while not self._stop.wait(self.threshold / 2):
+            beat = self._last_beat
+            late = time.monotonic() - beat - self.interval
+            if late > self.threshold and beat != self._reported_beat:
+                self._reported_beat = beat
+                frame = sys._current_frames().get(self.loop_thread_id)
+                stack = "".join(traceback.format_stack(frame)) if frame else "<unavailable>\n"
+                logger.warning("Event loop stalled for over %.0fms, blocking stack:\n%s", late * 1000, stack)
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+def sample_stacks(thread_ids, seconds, interval=0.005):
+    """Sample the given threads' stacks and return them in collapsed
+    ("folded") format, one ``root;...;leaf count`` line per distinct stack,
+    as consumed by flamegraph.pl and speedscope."""
+    tally = Tally()
+    own_id = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    samples = 0
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        for thread_id in thread_ids or frames:
+            frame = frames.get(thread_id)
+            if frame is None or thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            tally[";".join(reversed(stack))] += 1
+        samples += 1
+        time.sleep(interval)
+    lines = [f"{stack} {count}" for stack, count in tally.most_common()]
+    return samples, "\n".join(lines) + "\n"
+
+class ProfilerBusy(Exception):
+    pass
+
+class Profiler:
+    """Runs one time-boxed sampling profile at a time."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def run(self, thread_ids, seconds, interval):
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A profile is already running")
+        try:
+            return sample_stacks(thread_ids, min(seconds, MAX_PROFILE_SECONDS), interval)
+        finally:
+            self._lock.release()
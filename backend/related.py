@@ -0,0 +1,138 @@
+import asyncio
+import logging
+from collections import OrderedDict
+from itertools import chain
+import numpy as np
+from scipy import sparse
+
+logger = logging.getLogger(__name__)
+
+# "Customers also bought": for every product, the products that appear in the
+# most orders together with it. Counts live in a sparse product x product
+# co-occurrence matrix built from the incidence matrix of orders x products
+# (C = BᵀB without the diagonal). New orders are buffered and folded in by
+# `refresh`, which recomputes the top-k table only for the products they
+# touched. Lookups are a dict read on that table.
+
+def co_occurrence(baskets, size):
+    """Products x products counts of the orders that contain both."""
+    lengths = np.fromiter(map(len, baskets), dtype=np.int64, count=len(baskets))
+    rows = np.repeat(np.arange(len(baskets)), lengths)
+    cols = np.fromiter(chain.from_iterable(baskets), dtype=np.int64, count=int(lengths.sum()))
+    incidence = sparse.csr_matrix((np.ones(len(cols), dtype=np.int32), (rows, cols)), shape=(len(baskets), size))
+    counts = (incidence.T @ incidence).tocsr()
+    counts -= sparse.diags(counts.diagonal(), format="csr", dtype=counts.dtype)
+    counts.eliminate_zeros()
+    return counts
+
+def top_k(matrix, rows, k):
+    """(row, [(col, count), ...]) for each of ``rows``, highest counts first."""
+    sub = matrix[rows]
+    owner = np.repeat(np.arange(len(rows)), np.diff(sub.indptr))
+    # Highest count first; ties go to the lower column for a stable order
+    order = np.lexsort((sub.indices, -sub.data, owner))
+    rank = np.arange(len(order)) - sub.indptr[owner[order]]
+    keep = order[rank < k]
+    bounds = np.searchsorted(owner[keep], np.arange(len(rows) + 1))
+    cols, counts = sub.indices[keep].tolist(), sub.data[keep].tolist()
+    for i, row in enumerate(rows):
+        start, end = bounds[i], bounds[i + 1]
+        yield row, list(zip(cols[start:end], counts[start:end]))
+
+class RelatedProducts:
+    """Top-k co-purchased products per product, kept current as orders arrive."""
+
+    def __init__(self, k=10, remember=100000):
+        self.k = k
+        self.remember = remember
+        self.ids = []
+        self.positions = {}
+        self.matrix = sparse.csr_matrix((0, 0), dtype=np.int32)
+        self.table = {}
+        self.pending = []
+        self.seen = OrderedDict()
+        self._rebuilding = None
+        self._refresher = None
+
+    def _position(self, product_id):
+        position = self.positions.get(product_id)
+        if position is None:
+            position = self.positions[product_id] = len(self.ids)
+            self.ids.append(product_id)
+        return position
+
+    def add(self, order):
+        """Queue an order ({orderId, items: [{productId}]}) for the next refresh.
+
+        An order is counted once however many times it is added, so the
+        order endpoint and the change feed can both report it.
+        """
+        if self._rebuilding is not None:
+            self._rebuilding.append(order)
+        if order["orderId"] in self.seen:
+            return
+        self.seen[order["orderId"]] = None
+        if len(self.seen) > self.remember:
+            self.seen.popitem(last=False)
+        products = {item["productId"] for item in order.get("items", ())}
+        # A single product co-occurs with nothing
+        if len(products) > 1:
+            self.pending.append([self._position(product_id) for product_id in products])
+
+    def refresh(self):
+        """Fold queued orders into the counts; returns how many there were."""
+        if not self.pending:
+            return 0
+        baskets, self.pending = self.pending, []
+        size = len(self.ids)
+        if self.matrix.shape[0] < size:
+            self.matrix.resize((size, size))
+        self.matrix = self.matrix + co_occurrence(baskets, size)
+        touched = np.unique(np.fromiter(chain.from_iterable(baskets), dtype=np.int64))
+        for row, related in top_k(self.matrix, touched, self.k):
+            self.table[self.ids[row]] = [(self.ids[col], count) for col, count in related]
+        return len(baskets)
+
+    def related(self, product_id, limit=None):
+        """[(productId, orders together), ...], most co-purchased first."""
+        return self.table.get(product_id, [])[:limit]
+
+    async def rebuild(self, orders):
+        """Recount from every order in ``orders`` (the orders repository)."""
+        self._rebuilding = []
+        try:
+            fresh = RelatedProducts(self.k, self.remember)
+            count = 0
+            async for order in orders.iter_items():
+                fresh.add(order)
+                count += 1
+            fresh.refresh()
+            arrived = self._rebuilding
+        finally:
+            self._rebuilding = None
+        self.ids, self.positions, self.matrix = fresh.ids, fresh.positions, fresh.matrix
+        self.table, self.pending, self.seen = fresh.table, fresh.pending, fresh.seen
+        # Orders placed while the history was read; ones it saw are skipped
+        for order in arrived:
+            self.add(order)
+        self.refresh()
+        logger.info("Related products built from %d orders over %d products", count, len(self.ids))
+
+    async def _refresh_every(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception("Related products refresh failed")
+
+    def start(self, interval=5):
+        self._refresher = asyncio.get_running_loop().create_task(self._refresh_every(interval))
+
+    def stop(self):
+        if self._refresher:
+            self._refresher.cancel()
+            self._refresher = None
+
+    def stats(self):
+        return {"products": len(self.ids), "pairs": self.matrix.nnz // 2, "pending": len(self.pending), "k": self.k}
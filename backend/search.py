@@ -0,0 +1,227 @@
+import re
+import heapq
+import bisect
+import logging
+from collections import defaultdict
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of a term depending on the product field it came from
+FIELD_WEIGHTS = {
+    "name": 3.0,
+    "category": 2.0,
+    "fragrance": 2.0,
+    "description": 1.0,
+}
+
+# Score multipliers for how a query term matched an indexed term
+EXACT_MATCH = 1.0
+PREFIX_MATCH = 0.7
+FUZZY_MATCH = 0.4
+
+# Kept per product so listing filters and facet counts run over every match
+# without reading the products
+FILTER_FIELDS = ("category", "fragrance", "featured", "price")
+# What the index needs from a product document
+INDEX_FIELDS = ["id", *dict.fromkeys([*FIELD_WEIGHTS, *FILTER_FIELDS])]
+
+MIN_PREFIX_LENGTH = 2
+MIN_FUZZY_LENGTH = 4
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+def tokenize(text):
+    if not text:
+        return []
+    return TOKEN_RE.findall(text.lower())
+
+def _deletes(term):
+    return {term[:i] + term[i + 1:] for i in range(len(term))}
+
+def _within_one_edit(a, b):
+    # Levenshtein distance <= 1, plus adjacent transpositions
+    if a == b:
+        return True
+    la, lb = len(a), len(b)
+    if abs(la - lb) > 1:
+        return False
+    if la == lb:
+        diff = [i for i in range(la) if a[i] != b[i]]
+        if len(diff) == 1:
+            return True
+        return len(diff) == 2 and diff[1] == diff[0] + 1 and a[diff[0]] == b[diff[1]] and a[diff[1]] == b[diff[0]]
+    if la > lb:
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i:] == b[i + 1:]
+
+def matches_filters(attributes, filters):
+    # The listing filters of storage.products.list, minus "ids"
+    for field in ("category", "fragrance", "featured"):
+        if filters.get(field) is not None and attributes.get(field) != filters[field]:
+            return False
+    price = attributes.get("price")
+    if filters.get("minPrice") is not None and (price is None or price < filters["minPrice"]):
+        return False
+    if filters.get("maxPrice") is not None and (price is None or price > filters["maxPrice"]):
+        return False
+    return True
+
+class SearchIndex:
+    """In-memory inverted index over the product catalog.
+
+    Lookups touch only the postings of the query terms, so search cost depends
+    on the number of matching products rather than on the catalog size.
+    """
+
+    def __init__(self):
+        self.postings = defaultdict(dict)   # term -> {product_id: weight}
+        self.prefixes = defaultdict(set)    # prefix -> {term}
+        self.deletes = defaultdict(set)     # term with one char deleted -> {term}
+        self.doc_terms = {}                 # product_id -> {term}
+        self.attributes = {}                # product_id -> {filter field: value}
+
+    def __len__(self):
+        return len(self.doc_terms)
+
+    def _add_term(self, term):
+        for i in range(MIN_PREFIX_LENGTH, len(term)):
+            self.prefixes[term[:i]].add(term)
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                self.deletes[variant].add(term)
+
+    def _drop_term(self, term):
+        for i in range(MIN_PREFIX_LENGTH, len(term)):
+            terms = self.prefixes[term[:i]]
+            terms.discard(term)
+            if not terms:
+                del self.prefixes[term[:i]]
+        if len(term) >= MIN_FUZZY_LENGTH:
+            for variant in _deletes(term):
+                terms = self.deletes[variant]
+                terms.discard(term)
+                if not terms:
+                    del self.deletes[variant]
+
+    def add(self, product):
+        product_id = product["id"]
+        self.remove(product_id)
+        weights = defaultdict(float)
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(product.get(field)):
+                weights[term] = max(weights[term], weight)
+        for term, weight in weights.items():
+            if term not in self.postings:
+                self._add_term(term)
+            self.postings[term][product_id] = weight
+        self.doc_terms[product_id] = set(weights)
+        self.attributes[product_id] = {field: product.get(field) for field in FILTER_FIELDS}
+
+    def remove(self, product_id):
+        self.attributes.pop(product_id, None)
+        terms = self.doc_terms.pop(product_id, None)
+        if not terms:
+            return
+        for term in terms:
+            docs = self.postings[term]
+            docs.pop(product_id, None)
+            if not docs:
+                del self.postings[term]
+                self._drop_term(term)
+
+    def clear(self):
+        self.postings.clear()
+        self.prefixes.clear()
+        self.deletes.clear()
+        self.doc_terms.clear()
+        self.attributes.clear()
+
+    def replace(self, other):
+        # Takes over the contents of another index in one step
+        self.postings, self.prefixes, self.deletes = other.postings, other.prefixes, other.deletes
+        self.doc_terms, self.attributes = other.doc_terms, other.attributes
+
+    def _expand(self, token):
+        # Indexed terms a query token can stand for, with their match multiplier
+        matches = {}
+        if token in self.postings:
+            matches[token] = EXACT_MATCH
+        if len(token) >= MIN_PREFIX_LENGTH:
+            for term in self.prefixes.get(token, ()):
+                matches.setdefault(term, PREFIX_MATCH)
+        if len(token) >= MIN_FUZZY_LENGTH:
+            candidates = set(self.deletes.get(token, ()))
+            for variant in _deletes(token):
+                if variant in self.postings:
+                    candidates.add(variant)
+                candidates.update(self.deletes.get(variant, ()))
+            for term in candidates:
+                if term not in matches and _within_one_edit(token, term):
+                    matches[term] = FUZZY_MATCH
+        return matches
+
+    def _scores(self, text, filters=None):
+        # {product_id: score} for products matching every query token and the filters
+        tokens = tokenize(text)
+        if not tokens:
+            return {}
+        scores = None
+        for token in dict.fromkeys(tokens):
+            token_scores = defaultdict(float)
+            for term, multiplier in self._expand(token).items():
+                for product_id, weight in self.postings[term].items():
+                    score = weight * multiplier
+                    if score > token_scores[product_id]:
+                        token_scores[product_id] = score
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {pid: s + token_scores[pid] for pid, s in scores.items() if pid in token_scores}
+            if not scores:
+                return {}
+        if filters:
+            scores = {pid: s for pid, s in scores.items() if matches_filters(self.attributes[pid], filters)}
+        return scores
+
+    def search(self, text, limit=None, filters=None):
+        """Return product ids matching every query token, best match first.
+
+        ``filters`` are the listing filters (category, fragrance, featured,
+        minPrice, maxPrice); they are applied before ``limit``, so every
+        matching product can be reached.
+        """
+        scores = self._scores(text, filters)
+        key = lambda pid: (-scores[pid], pid)
+        if limit:
+            return heapq.nsmallest(limit, scores, key=key)
+        return sorted(scores, key=key)
+
+    def facet_counts(self, text, filters, fields, price_bounds):
+        """Facet counts over every product matching ``text`` and ``filters``.
+
+        Returns (total, {field: {value: count}}, {price bucket lower bound: count}).
+        """
+        scores = self._scores(text, filters)
+        counts = {field: defaultdict(int) for field in fields}
+        price_counts = defaultdict(int)
+        for product_id in scores:
+            attributes = self.attributes[product_id]
+            for field in fields:
+                counts[field][attributes.get(field)] += 1
+            if attributes.get("price") is not None:
+                i = bisect.bisect_right(price_bounds, attributes["price"]) - 1
+                if i >= 0:
+                    price_counts[price_bounds[i]] += 1
+        return len(scores), counts, price_counts
+
+async def build_search_index(index, products):
+    # Built aside and swapped in, so searches during the build see the old
+    # index rather than a partial one
+    fresh = SearchIndex()
+    async for product in products.iter_all(INDEX_FIELDS):
+        fresh.add(product)
+    index.replace(fresh)
+    logger.info("Search index built with %d products", len(index))
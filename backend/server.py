@@ -1,36 +1,254 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Query, Request, status
+from fastapi.responses import Response, JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
+import threading
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict, EmailStr
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, EmailStr, create_model
+from typing import List, Literal, Optional
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
 from jose import JWTError, jwt
+from pymongo.errors import DuplicateKeyError
+from database import Database
+from storage import FACET_FIELDS, STOCK_FIELDS, MemoryStorage, MotorStorage, facet_result
+from search import INDEX_FIELDS, SearchIndex, build_search_index
+from cache import CatalogCache, PrincipalCache
+from loaders import ProductLoader
+from carts import CartCoalescer
+from changefeed import ChangeFeed
+from related import RelatedProducts
+from jobs import JobQueue
+from inventory import Inventory, OutOfStock, ReservationNotFound, merge_lines, reservation_lines
+from hashing import PasswordHasher, HasherOverloaded
+from export import FORMATS, export_stream
+from importer import import_products
+from conditional import http_date, listing_etag, not_modified, product_etag
+from profiling import MAX_PROFILE_SECONDS, LoopMonitor, Profiler, ProfilerBusy
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, MetricsMiddleware, registry as metrics_registry
+from stats import (
+    get_stats, record_orders_created, record_order_status_changed,
+    record_product_count, record_user_created, record_user_role_changed,
+)
+from pagination import (
+    MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, PRODUCT_SORT, ORDER_SORT, USER_SORT,
+    InvalidCursor, decode_keyset_cursor, decode_offset_cursor, encode_offset_cursor, next_cursor,
+)
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened and closed by the app lifespan. Pool sizing,
+# timeouts and secondary reads for the catalog come from MONGO_* variables.
+database = Database.from_env()
+
+# Endpoints read and write through the storage repositories. The memory engine
+# can start empty or from a snapshot of MongoDB (MEMORY_SNAPSHOT_FROM_MONGO=1).
+STORAGE_ENGINE = os.environ.get('STORAGE_ENGINE', 'mongo')
+MEMORY_SNAPSHOT = STORAGE_ENGINE == 'memory' and os.environ.get('MEMORY_SNAPSHOT_FROM_MONGO') == '1'
+storage = MemoryStorage() if STORAGE_ENGINE == 'memory' else MotorStorage()
 
 # Security
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hasher = PasswordHasher(
+    pwd_context,
+    workers=int(os.environ.get('PASSWORD_HASH_WORKERS', 2)),
+    max_queue=int(os.environ.get('PASSWORD_HASH_QUEUE', 32)),
+)
 SECRET_KEY = os.environ.get('JWT_SECRET', 'your-secret-key-change-in-production')
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Checkout
+SHIPPING_FEE = 50.0
+ORDER_STATUSES = ("pending", "processing", "shipped", "delivered", "cancelled")
+USER_ROLES = ("user", "admin")
+
 security = HTTPBearer()
 
+# Verified tokens and authenticated users, so auth is not a DB round trip per request
+principal_cache = PrincipalCache(
+    maxsize=int(os.environ.get('AUTH_CACHE_SIZE', 10000)),
+    ttl=float(os.environ.get('AUTH_CACHE_TTL', 30)),
+)
+
+# Full-text product search; the index also filters and counts the matches,
+# so only the products on the requested page are read
+search_index = SearchIndex()
+
+# Browsers and the CDN may reuse catalog responses this long, then revalidate
+# them with If-None-Match / If-Modified-Since
+CATALOG_CACHE_CONTROL = f"public, max-age={int(os.environ.get('CATALOG_MAX_AGE', 60))}"
+
+# Lower bounds of the price buckets counted by /api/products/facets
+PRICE_BUCKETS = [0, 500, 750, 1000, 1500]
+
+# Storefront catalog cache, invalidated by the admin product endpoints
+CATALOG_CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 300))
+if not database.secondary_reads:
+    WRITE_LAG = 0
+elif database.max_staleness == -1:
+    # No bound on secondary lag; assume it stays within the cache TTL
+    WRITE_LAG = CATALOG_CACHE_TTL
+else:
+    WRITE_LAG = database.max_staleness
+catalog_cache = CatalogCache(
+    maxsize=int(os.environ.get('CATALOG_CACHE_SIZE', 1024)),
+    ttl=CATALOG_CACHE_TTL,
+    # A secondary can hand back data from before a write it has not caught up
+    # with; refills that soon after a write read from the primary, so that
+    # data is not cached for the whole TTL
+    write_lag=WRITE_LAG,
+)
+
+# Cart mutations from one user within this window are written together
+cart_writes = CartCoalescer(storage, delay=float(os.environ.get('CART_COALESCE_MS', 20)) / 1000)
+
+def order_side_effects(order):
+    # Post-order jobs other than committing the reservation; every handler
+    # is idempotent, so queuing them again is safe
+    return [
+        ("stats.order_created", {"orderId": order["orderId"], "status": order["status"], "total": order["total"]}),
+        # Keep items added to the cart after checkout
+        ("cart.clear", {"userId": order["userId"], "before": order["orderDate"]}),
+    ]
+
+async def requeue_side_effects(order):
+    await job_queue.enqueue_many(order_side_effects(order))
+
+# Stock reservations: held for RESERVATION_TTL seconds from checkout start,
+# returned to stock by a periodic sweep if no order is placed. A reservation
+# outliving its order means the order's jobs may not have been queued; the
+# sweep queues them again.
+inventory = Inventory(
+    storage,
+    ttl=float(os.environ.get('RESERVATION_TTL', 900)),
+    lease=float(os.environ.get('RESERVATION_LEASE', 60)),
+    recover=requeue_side_effects,
+    stock_changed=catalog_cache.stock_changed,
+)
+
+# Durable background jobs for post-checkout side effects
+job_queue = JobQueue(
+    storage,
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    batch_size=int(os.environ.get('JOB_BATCH_SIZE', 100)),
+    poll_interval=float(os.environ.get('JOB_POLL_INTERVAL', 1)),
+)
+
+@job_queue.handler("reservation.commit")
+async def commit_reservations(reservations):
+    for reservation in reservations:
+        await inventory.commit(reservation)
+
+@job_queue.handler("stats.order_created")
+async def count_orders(orders):
+    await record_orders_created(storage.stats, orders)
+
+@job_queue.handler("cart.clear")
+async def clear_carts(carts):
+    for cart in carts:
+        await storage.carts.delete(cart["userId"], before=cart["before"])
+
+# "Customers also bought", counted from order history and updated as orders
+# are placed; new orders are folded in every RELATED_PRODUCTS_REFRESH_INTERVAL.
+# Each product keeps at least as many as the largest `limit` can ask for.
+RELATED_LIMIT = 20
+related_products = RelatedProducts(k=max(int(os.environ.get('RELATED_PRODUCTS_K', RELATED_LIMIT)), RELATED_LIMIT))
+
+# Writes handled by any worker, this one included, reach every worker's caches
+# and search index through the change feed (MongoDB engine only)
+change_feed = ChangeFeed(poll_interval=float(os.environ.get('CHANGE_FEED_POLL_INTERVAL', 5)))
+
+async def product_changed(kind, product):
+    if product is None:
+        catalog_cache.clear()
+        await build_search_index(search_index, storage.products)
+    elif kind == "delete":
+        catalog_cache.product_deleted(product["id"])
+        search_index.remove(product["id"])
+    elif kind == "minor":
+        catalog_cache.stock_changed([product["id"]])
+    elif kind == "insert":
+        catalog_cache.product_created(product["id"])
+        search_index.add(product)
+    else:
+        catalog_cache.product_updated(product["id"])
+        search_index.add(product)
+
+async def order_changed(kind, order):
+    # Orders placed on other workers; this worker's own arrive twice and
+    # are counted once
+    if order is None:
+        await related_products.rebuild(storage.orders)
+    else:
+        related_products.add(order)
+
+async def user_changed(kind, user):
+    if user is None:
+        principal_cache.clear()
+    else:
+        principal_cache.invalidate_user(user["id"])
+
+# Deletes arrive with just the id and drop that product, as on the worker
+# that made them. Stock moves bump the version too, but likewise only evict
+# the product and the listings showing it, not everything a checkout would
+# empty. Resets (a lost stream, or any delete while polling) clear the cache
+# and rebuild the search index aside.
+change_feed.subscribe(
+    "products", product_changed, fields=INDEX_FIELDS, changed=["version"], minor=STOCK_FIELDS, key="id",
+)
+change_feed.subscribe("users", user_changed, fields=["id"])
+# Order items never change after insert, so status updates are skipped
+change_feed.subscribe("orders", order_changed, fields=["orderId", "items.productId"], changed=["items"], poll_field="orderDate")
+
+# Event-loop stall detection and on-demand sampling profiles
+loop_monitor = LoopMonitor(threshold=float(os.environ.get('LOOP_STALL_THRESHOLD_MS', 100)) / 1000)
+profiler = Profiler()
+
+# Connect, load the search index and start the background workers before
+# serving; stop them and close the client on shutdown
+@asynccontextmanager
+async def lifespan(app):
+    if os.environ.get('LOOP_MONITOR', '1') != '0':
+        loop_monitor.start(asyncio.get_running_loop())
+    try:
+        # The memory engine only needs MongoDB to take its snapshot
+        if STORAGE_ENGINE != 'memory' or MEMORY_SNAPSHOT:
+            database.connect()
+            await database.warmup()
+        if STORAGE_ENGINE == 'memory':
+            if MEMORY_SNAPSHOT:
+                await storage.load_from(database.primary)
+                database.close()
+        else:
+            storage.attach(database.primary, database.replica)
+        await storage.prepare()
+        await build_search_index(search_index, storage.products)
+        await related_products.rebuild(storage.orders)
+        related_products.start(float(os.environ.get('RELATED_PRODUCTS_REFRESH_INTERVAL', 5)))
+        inventory.start(float(os.environ.get('RESERVATION_SWEEP_INTERVAL', 30)))
+        job_queue.start()
+        if STORAGE_ENGINE != 'memory' and os.environ.get('CHANGE_FEED', '1') != '0':
+            change_feed.start(database.primary)
+        yield
+    finally:
+        change_feed.stop()
+        related_products.stop()
+        job_queue.stop()
+        inventory.stop()
+        password_hasher.shutdown()
+        loop_monitor.stop()
+        database.close()
+
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -77,6 +295,16 @@ class Product(BaseModel):
     sku: str
     featured: bool = False
     dateAdded: str
+    version: int = 0
+    updatedAt: Optional[str] = None
+
+# A product listing item: with ?fields= every field but id may be left out
+SparseProduct = create_model(
+    "SparseProduct",
+    __config__=ConfigDict(extra="ignore"),
+    id=(str, ...),
+    **{name: (Optional[field.annotation], None) for name, field in Product.model_fields.items() if name != "id"},
+)
 
 class ProductCreate(BaseModel):
     name: str
@@ -102,6 +330,9 @@ class Cart(BaseModel):
     items: List[CartItem]
     updatedAt: str
 
+class CartQuantity(BaseModel):
+    quantity: int
+
 class ShippingAddress(BaseModel):
     fullName: str
     email: EmailStr
@@ -115,11 +346,14 @@ class ShippingAddress(BaseModel):
 class OrderCreate(BaseModel):
     items: List[CartItem]
     shippingAddress: ShippingAddress
-    subtotal: float
-    shipping: float
-    total: float
+    # Totals are computed server-side; client values are accepted but ignored
+    subtotal: Optional[float] = None
+    shipping: Optional[float] = None
+    total: Optional[float] = None
     paymentMethod: str
     upiId: Optional[str] = None
+    # Returned by POST /api/checkout/reserve; without one, stock is reserved here
+    reservationId: Optional[str] = None
 
 class Order(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -139,12 +373,75 @@ class Order(BaseModel):
 class OrderStatusUpdate(BaseModel):
     status: str
 
+class UserRoleUpdate(BaseModel):
+    role: str
+
+# Listings are returned without re-validation: documents are validated when
+# written, and these field lists pin the response to the model's fields.
+PRODUCT_FIELDS = list(Product.model_fields)
+ORDER_FIELDS = list(Order.model_fields)
+USER_FIELDS = list(User.model_fields)
+# Always read for product listings: the cursor's sort keys and the ETag version
+PRODUCT_KEY_FIELDS = [field for field, _ in PRODUCT_SORT] + ["version"]
+
 # Helper functions
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+async def verify_password(plain_password, hashed_password):
+    return await password_hasher.verify(plain_password, hashed_password)
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+async def get_password_hash(password):
+    return await password_hasher.hash(password)
+
+def calculate_totals(items):
+    subtotal = round(sum(item["price"] * item["quantity"] for item in items), 2)
+    shipping = SHIPPING_FEE if subtotal > 0 else 0.0
+    return subtotal, shipping, round(subtotal + shipping, 2)
+
+def product_filters(category, fragrance, featured, minPrice, maxPrice):
+    return {
+        "category": category or None,
+        "fragrance": fragrance or None,
+        "featured": featured,
+        "minPrice": minPrice,
+        "maxPrice": maxPrice,
+    }
+
+def parse_product_fields(fields):
+    # ?fields=name,price -> ["id", "name", "price"]; None means every field
+    if not fields:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = sorted(set(requested) - set(Product.model_fields))
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown product fields: {', '.join(unknown)}")
+    return list(dict.fromkeys(["id", *requested]))
+
+def new_product_document(product_data: ProductCreate, sku=None):
+    product_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc).isoformat()
+    return {
+        "id": product_id,
+        "sku": sku or f"{product_data.category[:3].upper()}-{product_id[:8].upper()}",
+        "rating": 0.0,
+        "reviews": 0,
+        "dateAdded": now,
+        "version": 1,
+        "updatedAt": now,
+        **product_data.model_dump()
+    }
+
+def import_row(row):
+    # Rows with a SKU update the product that has it; others create products
+    sku = str(row.get("sku") or "").strip() or None
+    return new_product_document(ProductCreate.model_validate(row), sku)
+
+def new_order_id():
+    return f"ORD-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+
+def list_response(items, cursor=None, headers=None):
+    headers = dict(headers or {})
+    if cursor:
+        headers[NEXT_CURSOR_HEADER] = cursor
+    return ORJSONResponse(items, headers=headers or None)
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -160,18 +457,30 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
+    user_id = principal_cache.get_token(token)
+    if user_id is None:
+        try:
+            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            user_id: str = payload.get("sub")
+            if user_id is None:
+                raise credentials_exception
+        except JWTError:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
+        principal_cache.put_token(token, user_id, payload.get("exp"))
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user = principal_cache.get_user(user_id)
+    if user is not None:
+        return user
+    generation = principal_cache.generation
+    user = await storage.users.get(user_id)
     if user is None:
         raise credentials_exception
-    return User(**user)
+    user = User(**user)
+    principal_cache.put_user(user, generation)
+    return user
+
+async def get_product_loader():
+    return ProductLoader(storage.products)
 
 async def get_current_admin(current_user: User = Depends(get_current_user)):
     if current_user.role != "admin":
@@ -182,13 +491,13 @@ async def get_current_admin(current_user: User = Depends(get_current_user)):
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user_data: UserCreate):
     # Check if user exists
-    existing_user = await db.users.find_one({"email": user_data.email})
+    existing_user = await storage.users.get_by_email(user_data.email)
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
     user_id = str(uuid.uuid4())
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await get_password_hash(user_data.password)
     user_doc = {
         "id": user_id,
         "name": user_data.name,
@@ -197,7 +506,11 @@ async def register(user_data: UserCreate):
         "role": "user",
         "createdAt": datetime.now(timezone.utc).isoformat()
     }
-    await db.users.insert_one(user_doc)
+    try:
+        await storage.users.insert(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    await record_user_created(storage.stats, user_doc["role"])
     
     # Create token
     access_token = create_access_token(data={"sub": user_id})
@@ -207,12 +520,12 @@ async def register(user_data: UserCreate):
 
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(credentials: UserLogin):
-    user = await db.users.find_one({"email": credentials.email})
-    if not user or not verify_password(credentials.password, user["password"]):
+    user = await storage.users.get_by_email(credentials.email)
+    if not user or not await verify_password(credentials.password, user["password"]):
         raise HTTPException(status_code=401, detail="Invalid email or password")
     
     access_token = create_access_token(data={"sub": user["id"]})
-    user_data = User(**{k: v for k, v in user.items() if k != "password" and k != "_id"})
+    user_data = User(**{k: v for k, v in user.items() if k != "password"})
     
     return TokenResponse(access_token=access_token, user=user_data)
 
@@ -221,86 +534,189 @@ async def get_me(current_user: User = Depends(get_current_user)):
     return current_user
 
 # Product endpoints
-@api_router.get("/products", response_model=List[Product])
+@api_router.get(
+    "/products",
+    response_model=List[SparseProduct],
+    description="Every Product field is returned unless `fields` selects some; `id` always is.",
+)
 async def get_products(
+    request: Request,
     category: Optional[str] = None,
     search: Optional[str] = None,
     minPrice: Optional[float] = None,
     maxPrice: Optional[float] = None,
     fragrance: Optional[str] = None,
     featured: Optional[bool] = None,
-    limit: int = 50
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = Query(None, description="Comma-separated Product fields to return; id is always included"),
+    imageLimit: Optional[int] = Query(None, ge=1, description="Return at most this many images per product")
 ):
-    query = {}
-    if category:
-        query["category"] = category
-    if fragrance:
-        query["fragrance"] = fragrance
-    if featured is not None:
-        query["featured"] = featured
+    search = " ".join(search.lower().split()) if search else None
+    selected = parse_product_fields(fields)
+    # Only the selected fields are read from storage
+    read_fields = PRODUCT_FIELDS if selected is None else list(dict.fromkeys([*selected, *PRODUCT_KEY_FIELDS]))
+    # Search results are ranked in memory, so they page by offset into the ranking
+    offset = decode_offset_cursor(cursor) if search else 0
+    slices = {"images": imageLimit} if imageLimit else None
+    cache_key = (category, search, minPrice, maxPrice, fragrance, featured, limit, cursor, tuple(read_fields), imageLimit)
+    products = catalog_cache.get_listing(cache_key)
+    
+    if products is None:
+        snapshot = catalog_cache.snapshot()
+        filters = product_filters(category, fragrance, featured, minPrice, maxPrice)
+        
+        if search:
+            # One past the page, to tell whether there is a next one
+            page_ids = search_index.search(search, offset + limit + 1, filters)[offset:]
+            products = []
+            if page_ids:
+                filters["ids"] = page_ids
+                primary = catalog_cache.read_primary(page_ids)
+                products = await storage.products.list(filters, read_fields, len(page_ids), slices=slices, primary=primary)
+                rank = {product_id: i for i, product_id in enumerate(page_ids)}
+                products.sort(key=lambda p: rank[p["id"]])
+        else:
+            after = decode_keyset_cursor(cursor, PRODUCT_SORT)
+            primary = catalog_cache.read_primary()
+            products = await storage.products.list(filters, read_fields, limit, after, slices, primary)
+            if not primary and catalog_cache.read_primary([p["id"] for p in products]):
+                # Holds a product whose stock just moved; the replica may not have it yet
+                products = await storage.products.list(filters, read_fields, limit, after, slices, primary=True)
+        
+        catalog_cache.put_listing(cache_key, products, snapshot)
+    
     if search:
-        query["$or"] = [
-            {"name": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"category": {"$regex": search, "$options": "i"}}
-        ]
-    if minPrice is not None or maxPrice is not None:
-        query["price"] = {}
-        if minPrice is not None:
-            query["price"]["$gte"] = minPrice
-        if maxPrice is not None:
-            query["price"]["$lte"] = maxPrice
+        cursor = encode_offset_cursor(offset + limit) if len(products) > limit else None
+        products = products[:limit]
+    else:
+        cursor = next_cursor(products, limit, PRODUCT_SORT)
+    variant = f"{','.join(selected or ())};{imageLimit or ''}"
+    headers = {"ETag": listing_etag(products, variant), "Cache-Control": CATALOG_CACHE_CONTROL}
+    if not_modified(request.headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    if selected is not None:
+        products = [{field: p[field] for field in selected if field in p} for p in products]
+    return list_response(products, cursor, headers)
+
+@api_router.get("/products/facets")
+async def get_product_facets(
+    category: Optional[str] = None,
+    search: Optional[str] = None,
+    minPrice: Optional[float] = None,
+    maxPrice: Optional[float] = None,
+    fragrance: Optional[str] = None,
+    featured: Optional[bool] = None
+):
+    search = " ".join(search.lower().split()) if search else None
+    cache_key = (category, search, minPrice, maxPrice, fragrance, featured)
+    facets = catalog_cache.get_facets(cache_key)
     
-    products = await db.products.find(query, {"_id": 0}).limit(limit).to_list(limit)
-    return products
+    if facets is None:
+        snapshot = catalog_cache.snapshot()
+        filters = product_filters(category, fragrance, featured, minPrice, maxPrice)
+        if search:
+            total, counts, price_counts = search_index.facet_counts(search, filters, FACET_FIELDS, PRICE_BUCKETS)
+            facets = facet_result(total, counts, PRICE_BUCKETS, price_counts)
+        else:
+            facets = await storage.products.facets(filters, PRICE_BUCKETS, primary=catalog_cache.read_primary())
+        catalog_cache.put_facets(cache_key, facets, snapshot)
+    return facets
 
 @api_router.get("/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
-    product = await db.products.find_one({"id": product_id}, {"_id": 0})
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
+async def get_product(product_id: str, request: Request, response: Response):
+    product = catalog_cache.get_product(product_id)
+    if product is None:
+        snapshot = catalog_cache.snapshot()
+        product = await storage.products.get(product_id, primary=catalog_cache.read_primary([product_id]))
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        catalog_cache.put_product(product, snapshot)
+    
+    headers = {"ETag": product_etag(product), "Cache-Control": CATALOG_CACHE_CONTROL}
+    # Stock moves set stockUpdatedAt rather than updatedAt
+    modified = [product.get("updatedAt") or product.get("dateAdded"), product.get("stockUpdatedAt")]
+    last_modified = max(filter(None, modified), default=None)
+    if last_modified:
+        headers["Last-Modified"] = http_date(last_modified)
+    if not_modified(request.headers, headers["ETag"], last_modified):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
     return product
 
+@api_router.get("/products/{product_id}/related", response_model=List[Product])
+async def get_related_products(product_id: str, request: Request, limit: int = Query(4, ge=1, le=RELATED_LIMIT)):
+    related_ids = [related_id for related_id, _ in related_products.related(product_id, limit)]
+    found = {related_id: catalog_cache.get_product(related_id) for related_id in related_ids}
+    missing = [related_id for related_id, product in found.items() if product is None]
+    if missing:
+        snapshot = catalog_cache.snapshot()
+        for product in await storage.products.get_many(missing):
+            catalog_cache.put_product(product, snapshot)
+            found[product["id"]] = product
+    # Products deleted since they were ordered are left out. Cached products
+    # are whole documents, reservations and all, so only the model's fields go out
+    products = [
+        {field: found[related_id][field] for field in PRODUCT_FIELDS if field in found[related_id]}
+        for related_id in related_ids if found[related_id]
+    ]
+    
+    headers = {"ETag": listing_etag(products, "related"), "Cache-Control": CATALOG_CACHE_CONTROL}
+    if not_modified(request.headers, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return list_response(products, headers=headers)
+
 @api_router.post("/products", response_model=Product)
 async def create_product(product_data: ProductCreate, current_user: User = Depends(get_current_admin)):
-    product_id = str(uuid.uuid4())
-    sku = f"{product_data.category[:3].upper()}-{product_id[:8].upper()}"
+    product_doc = new_product_document(product_data)
     
-    product_doc = {
-        "id": product_id,
-        "sku": sku,
-        "rating": 0.0,
-        "reviews": 0,
-        "dateAdded": datetime.now(timezone.utc).isoformat(),
-        **product_data.model_dump()
-    }
-    
-    await db.products.insert_one(product_doc)
-    return Product(**{k: v for k, v in product_doc.items() if k != "_id"})
+    try:
+        await storage.products.insert(product_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=409, detail="A product with this SKU already exists")
+    search_index.add(product_doc)
+    catalog_cache.product_created(product_doc["id"])
+    await record_product_count(storage.stats, 1)
+    return product_doc
 
 @api_router.put("/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductCreate, current_user: User = Depends(get_current_admin)):
-    existing = await db.products.find_one({"id": product_id})
-    if not existing:
+    updated = await storage.products.update(product_id, product_data.model_dump())
+    if not updated:
         raise HTTPException(status_code=404, detail="Product not found")
     
-    update_doc = product_data.model_dump()
-    await db.products.update_one({"id": product_id}, {"$set": update_doc})
-    
-    updated = await db.products.find_one({"id": product_id}, {"_id": 0})
-    return Product(**updated)
+    search_index.add(updated)
+    catalog_cache.product_updated(product_id)
+    return updated
 
 @api_router.delete("/products/{product_id}")
 async def delete_product(product_id: str, current_user: User = Depends(get_current_admin)):
-    result = await db.products.delete_one({"id": product_id})
-    if result.deleted_count == 0:
+    if not await storage.products.delete(product_id):
         raise HTTPException(status_code=404, detail="Product not found")
+    search_index.remove(product_id)
+    catalog_cache.product_deleted(product_id)
+    await record_product_count(storage.stats, -1)
     return {"message": "Product deleted successfully"}
 
+@api_router.post("/products/import")
+async def import_product_catalog(
+    request: Request,
+    format: Literal["ndjson", "csv"] = "ndjson",
+    batchSize: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_admin)
+):
+    # The body is read as it streams in; rows are reported by line number
+    report = await import_products(storage.products, request.stream(), format, import_row, batchSize)
+    if report.inserted or report.updated:
+        catalog_cache.clear()
+        await build_search_index(search_index, storage.products)
+        await record_product_count(storage.stats, report.inserted)
+    return report.as_dict()
+
 # Cart endpoints
 @api_router.get("/cart", response_model=Cart)
 async def get_cart(current_user: User = Depends(get_current_user)):
-    cart = await db.carts.find_one({"userId": current_user.id}, {"_id": 0})
+    cart = await storage.carts.get(current_user.id)
     if not cart:
         cart = {
             "userId": current_user.id,
@@ -311,29 +727,39 @@ async def get_cart(current_user: User = Depends(get_current_user)):
 
 @api_router.post("/cart")
 async def update_cart(cart_items: List[CartItem], current_user: User = Depends(get_current_user)):
-    cart_doc = {
-        "userId": current_user.id,
-        "items": [item.model_dump() for item in cart_items],
-        "updatedAt": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.carts.update_one(
-        {"userId": current_user.id},
-        {"$set": cart_doc},
-        upsert=True
-    )
-    
+    await cart_writes.replace(current_user.id, [item.model_dump() for item in cart_items])
     return {"message": "Cart updated successfully"}
 
+@api_router.post("/cart/items", response_model=Cart)
+async def add_cart_item(cart_item: CartItem, current_user: User = Depends(get_current_user)):
+    if cart_item.quantity < 1:
+        raise HTTPException(status_code=400, detail="Item quantity must be at least 1")
+    return await cart_writes.add(current_user.id, cart_item.productId, cart_item.quantity)
+
+@api_router.put("/cart/items/{product_id}", response_model=Cart)
+async def set_cart_item_quantity(product_id: str, update: CartQuantity, current_user: User = Depends(get_current_user)):
+    if update.quantity < 0:
+        raise HTTPException(status_code=400, detail="Item quantity cannot be negative")
+    return await cart_writes.set_quantity(current_user.id, product_id, update.quantity)
+
+@api_router.delete("/cart/items/{product_id}", response_model=Cart)
+async def remove_cart_item(product_id: str, current_user: User = Depends(get_current_user)):
+    return await cart_writes.remove(current_user.id, product_id)
+
 # Order endpoints
 @api_router.post("/orders", response_model=Order)
-async def create_order(order_data: OrderCreate, current_user: User = Depends(get_current_user)):
-    order_id = f"ORD-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:8].upper()}"
+async def create_order(
+    order_data: OrderCreate,
+    current_user: User = Depends(get_current_user),
+    products: ProductLoader = Depends(get_product_loader)
+):
+    if any(item.quantity < 1 for item in order_data.items):
+        raise HTTPException(status_code=400, detail="Item quantity must be at least 1")
     
-    # Get product details for items
+    # Get product details for all items in one query
+    resolved = await products.load_many([item.productId for item in order_data.items])
     items_with_details = []
-    for item in order_data.items:
-        product = await db.products.find_one({"id": item.productId}, {"_id": 0})
+    for item, product in zip(order_data.items, resolved):
         if product:
             items_with_details.append({
                 "productId": item.productId,
@@ -342,14 +768,31 @@ async def create_order(order_data: OrderCreate, current_user: User = Depends(get
                 "quantity": item.quantity,
                 "image": product["images"][0] if product["images"] else ""
             })
+    if not items_with_details:
+        raise HTTPException(status_code=400, detail="Order has no available products")
+    
+    # Hold the stock before the order exists; the reservation id is the order id
+    lines = merge_lines(items_with_details)
+    if order_data.reservationId:
+        # A retry of an order that was already placed gets that order back
+        existing = await storage.orders.get(order_data.reservationId, current_user.id)
+        if existing:
+            return existing
+        reservation = await inventory.claim(order_data.reservationId, current_user.id)
+        if reservation_lines(reservation) != lines:
+            raise HTTPException(status_code=400, detail="Order items do not match the reservation")
+    else:
+        reservation = await inventory.reserve(new_order_id(), current_user.id, lines)
+    order_id = reservation["id"]
     
+    subtotal, shipping, total = calculate_totals(items_with_details)
     order_doc = {
         "orderId": order_id,
         "userId": current_user.id,
         "items": items_with_details,
-        "subtotal": order_data.subtotal,
-        "shipping": order_data.shipping,
-        "total": order_data.total,
+        "subtotal": subtotal,
+        "shipping": shipping,
+        "total": total,
         "status": "pending",
         "shippingAddress": order_data.shippingAddress.model_dump(),
         "paymentMethod": order_data.paymentMethod,
@@ -358,66 +801,164 @@ async def create_order(order_data: OrderCreate, current_user: User = Depends(get
         "expectedDelivery": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat()
     }
     
-    await db.orders.insert_one(order_doc)
+    try:
+        await storage.orders.insert(order_doc)
+    except DuplicateKeyError:
+        # A concurrent retry placed it first; its stock is held by that order
+        existing = await storage.orders.get(order_id, current_user.id)
+        if existing is None:
+            raise
+        return existing
+    except Exception:
+        await inventory.release(reservation)
+        raise
+    related_products.add(order_doc)
     
-    # Clear cart
-    await db.carts.delete_one({"userId": current_user.id})
+    # The order is placed; everything else runs on the job queue. The commit,
+    # which deletes the reservation, is queued last: if queuing fails part
+    # way the reservation stays, and once it expires the sweep settles it and
+    # queues the other jobs again. The order stands either way.
+    try:
+        await job_queue.enqueue_many([
+            *order_side_effects(order_doc),
+            ("reservation.commit", {"id": reservation["id"], "lines": reservation["lines"]}),
+        ])
+    except Exception:
+        logger.exception("Could not enqueue post-order jobs for %s; the reservation sweep will", order_id)
     
-    return Order(**{k: v for k, v in order_doc.items() if k != "_id"})
+    return order_doc
+
+@api_router.post("/checkout/reserve")
+async def reserve_stock(cart_items: List[CartItem], current_user: User = Depends(get_current_user)):
+    if not cart_items or any(item.quantity < 1 for item in cart_items):
+        raise HTTPException(status_code=400, detail="Item quantity must be at least 1")
+    reservation = await inventory.reserve(
+        new_order_id(), current_user.id, merge_lines(item.model_dump() for item in cart_items)
+    )
+    return {"reservationId": reservation["id"], "items": reservation["lines"], "expiresAt": reservation["expiresAt"]}
 
 @api_router.get("/orders", response_model=List[Order])
-async def get_orders(current_user: User = Depends(get_current_user)):
-    query = {"userId": current_user.id} if current_user.role != "admin" else {}
-    orders = await db.orders.find(query, {"_id": 0}).sort("orderDate", -1).to_list(100)
-    return orders
+async def get_orders(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    user_id = current_user.id if current_user.role != "admin" else None
+    after = decode_keyset_cursor(cursor, ORDER_SORT)
+    orders = await storage.orders.list(ORDER_FIELDS, limit, after, user_id=user_id)
+    return list_response(orders, next_cursor(orders, limit, ORDER_SORT))
 
 @api_router.get("/orders/{order_id}", response_model=Order)
 async def get_order(order_id: str, current_user: User = Depends(get_current_user)):
-    query = {"orderId": order_id}
-    if current_user.role != "admin":
-        query["userId"] = current_user.id
-    
-    order = await db.orders.find_one(query, {"_id": 0})
+    user_id = current_user.id if current_user.role != "admin" else None
+    order = await storage.orders.get(order_id, user_id)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     return order
 
 @api_router.patch("/orders/{order_id}/status")
 async def update_order_status(order_id: str, status_update: OrderStatusUpdate, current_user: User = Depends(get_current_admin)):
-    result = await db.orders.update_one(
-        {"orderId": order_id},
-        {"$set": {"status": status_update.status}}
-    )
-    if result.matched_count == 0:
+    if status_update.status not in ORDER_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid order status")
+    previous = await storage.orders.set_status(order_id, status_update.status)
+    if previous is None:
         raise HTTPException(status_code=404, detail="Order not found")
+    await record_order_status_changed(storage.stats, previous["status"], status_update.status, previous.get("total", 0))
     return {"message": "Order status updated successfully"}
 
 # Admin endpoints
 @api_router.get("/admin/dashboard")
 async def get_dashboard_stats(current_user: User = Depends(get_current_admin)):
-    total_products = await db.products.count_documents({})
-    total_orders = await db.orders.count_documents({})
-    total_users = await db.users.count_documents({"role": "user"})
-    
-    # Calculate total sales
-    orders = await db.orders.find({"status": {"$ne": "cancelled"}}, {"total": 1, "_id": 0}).to_list(1000)
-    total_sales = sum(order.get("total", 0) for order in orders)
+    # Counters are maintained incrementally by the write endpoints
+    stats = await get_stats(storage.stats)
     
     # Recent orders
-    recent_orders = await db.orders.find({}, {"_id": 0}).sort("orderDate", -1).limit(10).to_list(10)
+    recent_orders = await storage.orders.list(ORDER_FIELDS, 10)
     
     return {
-        "totalSales": total_sales,
-        "totalOrders": total_orders,
-        "totalProducts": total_products,
-        "totalUsers": total_users,
+        **stats,
         "recentOrders": recent_orders
     }
 
+@api_router.get("/admin/cache")
+async def get_cache_stats(current_user: User = Depends(get_current_admin)):
+    return {"catalog": catalog_cache.stats(), "principals": principal_cache.stats(), "cartWrites": cart_writes.stats(), "relatedProducts": related_products.stats()}
+
+@api_router.get("/admin/jobs")
+async def get_job_stats(current_user: User = Depends(get_current_admin)):
+    return await storage.jobs.counts()
+
 @api_router.get("/admin/users", response_model=List[User])
-async def get_users(current_user: User = Depends(get_current_admin)):
-    users = await db.users.find({}, {"_id": 0, "password": 0}).to_list(100)
-    return users
+async def get_users(
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    current_user: User = Depends(get_current_admin)
+):
+    after = decode_keyset_cursor(cursor, USER_SORT)
+    users = await storage.users.list(USER_FIELDS, limit, after)
+    return list_response(users, next_cursor(users, limit, USER_SORT))
+
+@api_router.patch("/admin/users/{user_id}/role")
+async def update_user_role(user_id: str, role_update: UserRoleUpdate, current_user: User = Depends(get_current_admin)):
+    if role_update.role not in USER_ROLES:
+        raise HTTPException(status_code=400, detail="Invalid role")
+    previous = await storage.users.set_role(user_id, role_update.role)
+    if previous is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    principal_cache.invalidate_user(user_id)
+    await record_user_role_changed(storage.stats, previous["role"], role_update.role)
+    return {"message": "User role updated successfully"}
+
+@api_router.get("/admin/export/{collection}")
+async def export_collection(
+    collection: Literal["orders", "users", "products"],
+    format: Literal["ndjson", "csv"] = "ndjson",
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    batchSize: int = Query(1000, ge=1, le=10000),
+    current_user: User = Depends(get_current_admin)
+):
+    filename = f"{collection}-{datetime.now(timezone.utc).strftime('%Y%m%d%H%M%S')}.{format}"
+    return StreamingResponse(
+        export_stream(storage, collection, format, since, until, batchSize),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@api_router.get("/admin/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=MAX_PROFILE_SECONDS),
+    interval: float = Query(0.005, ge=0.001, le=1),
+    threads: Literal["loop", "all"] = "loop",
+    current_user: User = Depends(get_current_admin)
+):
+    # This handler runs on the event loop thread, which is what "loop" samples
+    thread_ids = [threading.get_ident()] if threads == "loop" else None
+    try:
+        samples, folded = await asyncio.to_thread(profiler.run, thread_ids, seconds, interval)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(folded, headers={
+        "X-Profile-Samples": str(samples),
+        "Content-Disposition": 'attachment; filename="profile.folded"'
+    })
+
+# Error handlers
+@app.exception_handler(InvalidCursor)
+async def invalid_cursor_handler(request: Request, exc: InvalidCursor):
+    return JSONResponse(status_code=400, content={"detail": str(exc)})
+
+@app.exception_handler(OutOfStock)
+async def out_of_stock_handler(request: Request, exc: OutOfStock):
+    return JSONResponse(status_code=409, content={"detail": str(exc), "productIds": exc.product_ids})
+
+@app.exception_handler(ReservationNotFound)
+async def reservation_not_found_handler(request: Request, exc: ReservationNotFound):
+    return JSONResponse(status_code=409, content={"detail": str(exc)})
+
+@app.exception_handler(HasherOverloaded)
+async def hasher_overloaded_handler(request: Request, exc: HasherOverloaded):
+    return JSONResponse(status_code=503, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -427,20 +968,42 @@ app.include_router(api_router)
 async def root():
     return {"message": "Candle Shop API is running", "status": "healthy"}
 
+def runtime_metrics():
+    caches = {
+        "catalog_products": catalog_cache.products,
+        "catalog_listings": catalog_cache.listings,
+        "catalog_facets": catalog_cache.facets,
+        "auth_tokens": principal_cache.tokens,
+        "auth_users": principal_cache.users,
+    }
+    yield "cache_hits_total", "Cache hits", "counter", {(name,): c.hits for name, c in caches.items()}, ("cache",)
+    yield "cache_misses_total", "Cache misses", "counter", {(name,): c.misses for name, c in caches.items()}, ("cache",)
+    yield "cache_entries", "Entries currently cached", "gauge", {(name,): len(c) for name, c in caches.items()}, ("cache",)
+    yield "cart_mutations_total", "Cart item mutations received", "counter", {(): cart_writes.mutations}, ()
+    yield "cart_writes_total", "Cart writes after coalescing", "counter", {(): cart_writes.writes}, ()
+    hasher = password_hasher.stats()
+    yield "password_hash_pending", "Password hashes running or queued", "gauge", {(): hasher["pending"]}, ()
+    yield "password_hash_rejected_total", "Password hashes rejected because the pool was full", "counter", {(): hasher["rejected"]}, ()
+
+metrics_registry.add_collector(runtime_metrics)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    return PlainTextResponse(metrics_registry.render(), media_type=METRICS_CONTENT_TYPE)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
+app.add_middleware(MetricsMiddleware)
 
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
-
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
@@ -0,0 +1,121 @@
+import asyncio
+import os
+import sys
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+logger = logging.getLogger(__name__)
+
+# Running dashboard counters live in one document, updated with $inc by the
+# endpoints that change them and recomputed from scratch by rebuild_stats().
+# The record_* helpers take the storage engine's stats repository.
+STATS_ID = "dashboard"
+CANCELLED = "cancelled"
+
+# Background jobs run at least once. The ids of the most recently counted
+# orders are kept on the counters document, and an increment naming any of
+# them is refused, so a retried job does not count its orders twice. Retries
+# come within minutes, long before this many later orders push an id out.
+APPLIED_WINDOW = 2000
+
+def order_created_fields(order):
+    fields = {"totalOrders": 1, f"ordersByStatus.{order['status']}": 1}
+    if order["status"] != CANCELLED:
+        fields["totalSales"] = order["total"]
+    return fields
+
+async def record_orders_created(counters, orders):
+    # One $inc for a batch of orders; if some were already counted, each
+    # order is applied on its own so the rest still are
+    fields = {}
+    for order in orders:
+        for field, amount in order_created_fields(order).items():
+            fields[field] = fields.get(field, 0) + amount
+    if not fields or await counters.increment(fields, once=[order["orderId"] for order in orders]):
+        return
+    for order in orders:
+        await counters.increment(order_created_fields(order), once=[order["orderId"]])
+
+async def record_order_status_changed(counters, old_status, new_status, total):
+    if old_status == new_status:
+        return
+    fields = {f"ordersByStatus.{old_status}": -1, f"ordersByStatus.{new_status}": 1}
+    if new_status == CANCELLED:
+        fields["totalSales"] = -total
+    elif old_status == CANCELLED:
+        fields["totalSales"] = total
+    await counters.increment(fields)
+
+async def record_user_created(counters, role):
+    await counters.increment({f"usersByRole.{role}": 1})
+
+async def record_user_role_changed(counters, old_role, new_role):
+    if old_role != new_role:
+        await counters.increment({f"usersByRole.{old_role}": -1, f"usersByRole.{new_role}": 1})
+
+async def record_product_count(counters, delta):
+    await counters.increment({"totalProducts": delta})
+
+async def rebuild_stats(db):
+    # Counts and the newest order ids come out of one pass over the orders, so
+    # the ids marked applied are ones that were counted; their queued
+    # stats.order_created jobs then do not count them again
+    [orders] = await db.orders.aggregate([
+        {"$facet": {
+            "byStatus": [{"$group": {
+                "_id": "$status",
+                "count": {"$sum": 1},
+                "sales": {"$sum": {"$cond": [{"$ne": ["$status", CANCELLED]}, "$total", 0]}},
+            }}],
+            "recent": [
+                {"$sort": {"orderDate": -1, "orderId": -1}},
+                {"$limit": APPLIED_WINDOW},
+                {"$project": {"_id": 0, "orderId": 1}},
+            ],
+        }},
+    ], allowDiskUse=True).to_list(1)
+    by_status = orders["byStatus"]
+    users = await db.users.aggregate([
+        {"$group": {"_id": "$role", "count": {"$sum": 1}}},
+    ]).to_list(None)
+    doc = {
+        "totalOrders": sum(row["count"] for row in by_status),
+        "totalSales": sum(row["sales"] for row in by_status),
+        "ordersByStatus": {str(row["_id"]): row["count"] for row in by_status},
+        "usersByRole": {str(row["_id"]): row["count"] for row in users},
+        "totalProducts": await db.products.count_documents({}),
+    }
+    # Oldest first, as increments append them
+    applied = [row["orderId"] for row in reversed(orders["recent"])]
+    await db.stats.replace_one({"_id": STATS_ID}, {**doc, "applied": applied}, upsert=True)
+    logger.info("Rebuilt dashboard stats: %d orders, %d products", doc["totalOrders"], doc["totalProducts"])
+    return doc
+
+def summarize_stats(doc):
+    return {
+        "totalSales": round(doc.get("totalSales", 0), 2),
+        "totalOrders": doc.get("totalOrders", 0),
+        "totalProducts": doc.get("totalProducts", 0),
+        "totalUsers": doc.get("usersByRole", {}).get("user", 0),
+        "ordersByStatus": {k: v for k, v in doc.get("ordersByStatus", {}).items() if v},
+        "usersByRole": doc.get("usersByRole", {}),
+    }
+
+async def get_stats(counters):
+    return summarize_stats(await counters.get())
+
+async def main():
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ.get('MONGO_URL', 'mongodb://localhost:27017'))
+    db = client[os.environ.get('DB_NAME', 'test_database')]
+    try:
+        print(summarize_stats(await rebuild_stats(db)))
+    finally:
+        client.close()
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(asyncio.run(main()))
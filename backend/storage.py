@@ -0,0 +1,901 @@
+import bisect
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from indexes import ensure_indexes
+from pagination import PRODUCT_SORT, ORDER_SORT, USER_SORT, keyset_filter
+from stats import APPLIED_WINDOW, CANCELLED, STATS_ID, rebuild_stats
+
+logger = logging.getLogger(__name__)
+
+# Repositories for users, products, carts and orders. Every endpoint goes
+# through one of two engines with the same interface:
+#
+#   MotorStorage  - the MongoDB collections (production)
+#   MemoryStorage - indexed in-process dicts, for tests, benchmarks that
+#                   should not include Mongo latency, and hot read-only data
+#
+# Listing methods take `after`, the decoded keyset cursor values, and
+# `fields`, the fields to return. Documents never carry Mongo's `_id`.
+
+def _projection(fields, slices=None):
+    # slices: {array field: n} returns only its first n elements
+    projection = {"_id": 0, **{field: 1 for field in fields}}
+    for field, n in (slices or {}).items():
+        if field in projection:
+            projection[field] = {"$slice": n}
+    return projection
+
+def _product_query(filters):
+    query = {}
+    for field in ("category", "fragrance", "featured"):
+        if filters.get(field) is not None:
+            query[field] = filters[field]
+    if filters.get("ids") is not None:
+        query["id"] = {"$in": list(filters["ids"])}
+    if filters.get("minPrice") is not None or filters.get("maxPrice") is not None:
+        query["price"] = {}
+        if filters.get("minPrice") is not None:
+            query["price"]["$gte"] = filters["minPrice"]
+        if filters.get("maxPrice") is not None:
+            query["price"]["$lte"] = filters["maxPrice"]
+    return query
+
+def _upsert_error(error, products):
+    # Two imports creating the same SKU at once: the unique index lets one in
+    if error.get("code") == 11000:
+        return f"Another product was created with SKU {products[error['index']]['sku']} at the same time; retry the row"
+    return error["errmsg"]
+
+def _after(query, after, sort):
+    if not after:
+        return query
+    keyset = keyset_filter(after, sort)
+    return {"$and": [query, keyset]} if query else keyset
+
+FACET_FIELDS = ("category", "fragrance", "featured")
+
+# Set when an imported product is first created, never overwritten by re-imports
+INSERT_ONLY_FIELDS = ("id", "sku", "rating", "reviews", "dateAdded", "version")
+
+# Every change to a product document increments `version`; they back the
+# catalog ETag. Content changes set `updatedAt`, stock moves set
+# `stockUpdatedAt` instead, and Last-Modified is the later of the two. Stock
+# moves are frequent and only touch STOCK_FIELDS, so cache invalidation can
+# tell them apart from edits.
+STOCK_FIELDS = ("stock", "reservations", "version", "stockUpdatedAt")
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def facet_result(total, counts, price_bounds, price_counts):
+    # counts: {field: {value: count}}; price_counts: {bucket lower bound: count}
+    result = {"total": total}
+    for field in FACET_FIELDS:
+        values = counts.get(field, {})
+        result[field] = [
+            {"value": value, "count": count}
+            for value, count in sorted(values.items(), key=lambda vc: (-vc[1], str(vc[0])))
+            if value is not None
+        ]
+    result["price"] = [
+        {"min": low, "max": high, "count": price_counts.get(low, 0)}
+        for low, high in zip(price_bounds, list(price_bounds[1:]) + [None])
+    ]
+    return result
+
+def _date_range(field, since, until):
+    query = {}
+    if since or until:
+        query[field] = {}
+        if since:
+            query[field]["$gte"] = since
+        if until:
+            query[field]["$lt"] = until
+    return query
+
+# MongoDB engine
+
+class MotorUsers:
+    def __init__(self, db, reads=None):
+        self.collection = db.users
+        self.reads = (db if reads is None else reads).users
+
+    async def get(self, user_id):
+        return await self.collection.find_one({"id": user_id}, {"_id": 0, "password": 0})
+
+    async def get_by_email(self, email):
+        return await self.collection.find_one({"email": email}, {"_id": 0})
+
+    async def insert(self, user):
+        await self.collection.insert_one(dict(user))
+
+    async def list(self, fields, limit, after=None):
+        query = _after({}, after, USER_SORT)
+        return await self.reads.find(query, _projection(fields)).sort(USER_SORT).limit(limit).to_list(limit)
+
+    async def set_role(self, user_id, role):
+        return await self.collection.find_one_and_update(
+            {"id": user_id},
+            {"$set": {"role": role, "updatedAt": _now()}},
+            projection={"_id": 0, "role": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+class MotorProducts:
+    def __init__(self, db, reads=None):
+        self.collection = db.products
+        self.reads = (db if reads is None else reads).products
+
+    # Catalog reads take `primary=True` to see a write the replica reads may
+    # not have caught up with yet
+
+    async def get(self, product_id, primary=False):
+        reads = self.collection if primary else self.reads
+        return await reads.find_one({"id": product_id}, {"_id": 0})
+
+    async def get_many(self, product_ids):
+        # Prices an order, so it reads what was last written
+        return await self.collection.find({"id": {"$in": list(product_ids)}}, {"_id": 0}).to_list(len(product_ids))
+
+    async def list(self, filters, fields, limit, after=None, slices=None, primary=False):
+        query = _after(_product_query(filters), after, PRODUCT_SORT)
+        reads = self.collection if primary else self.reads
+        return await reads.find(query, _projection(fields, slices)).sort(PRODUCT_SORT).limit(limit).to_list(limit)
+
+    async def iter_all(self, fields):
+        # Rebuilds the search index right after an import
+        async for product in self.collection.find({}, _projection(fields)):
+            yield product
+
+    async def facets(self, filters, price_bounds, primary=False):
+        # Every count in one $facet aggregation over the filtered products
+        facet = {field: [{"$group": {"_id": f"${field}", "count": {"$sum": 1}}}] for field in FACET_FIELDS}
+        facet["total"] = [{"$count": "count"}]
+        facet["price"] = [{"$bucket": {
+            "groupBy": "$price",
+            "boundaries": [*price_bounds, float("inf")],
+            "default": "other",
+        }}]
+        pipeline = [{"$match": _product_query(filters)}, {"$facet": facet}]
+        [row] = await (self.collection if primary else self.reads).aggregate(pipeline).to_list(1)
+        counts = {field: {group["_id"]: group["count"] for group in row[field]} for field in FACET_FIELDS}
+        total = row["total"][0]["count"] if row["total"] else 0
+        return facet_result(total, counts, price_bounds, {b["_id"]: b["count"] for b in row["price"]})
+
+    async def insert(self, product):
+        await self.collection.insert_one(dict(product))
+
+    async def update(self, product_id, changes):
+        return await self.collection.find_one_and_update(
+            {"id": product_id},
+            {"$set": {"updatedAt": _now(), **changes}, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, product_id):
+        result = await self.collection.delete_one({"id": product_id})
+        return result.deleted_count > 0
+
+    async def upsert_many(self, products):
+        # One unordered bulk write of upserts keyed by SKU; returns
+        # (inserted, updated, {batch index: error message})
+        ops = [
+            UpdateOne(
+                {"sku": product["sku"]},
+                {
+                    "$set": {k: v for k, v in product.items() if k not in INSERT_ONLY_FIELDS},
+                    "$setOnInsert": {k: product[k] for k in INSERT_ONLY_FIELDS if k in product and k not in ("sku", "version")},
+                    "$inc": {"version": 1},
+                },
+                upsert=True
+            )
+            for product in products
+        ]
+        try:
+            details = (await self.collection.bulk_write(ops, ordered=False)).bulk_api_result
+        except BulkWriteError as e:
+            details = e.details
+        failures = {error["index"]: _upsert_error(error, products) for error in details.get("writeErrors", [])}
+        return details.get("nUpserted", 0), details.get("nMatched", 0), failures
+
+    async def reserve_stock(self, reservation_id, lines):
+        # One conditional decrement per product in a single bulk write. Products
+        # already marked with this reservation are skipped, so retries are safe.
+        now = _now()
+        ops = [
+            UpdateOne(
+                {"id": pid, "stock": {"$gte": qty}, "reservations": {"$ne": reservation_id}},
+                {"$inc": {"stock": -qty, "version": 1}, "$set": {"stockUpdatedAt": now}, "$push": {"reservations": reservation_id}}
+            )
+            for pid, qty in lines.items()
+        ]
+        result = await self.collection.bulk_write(ops, ordered=False)
+        if result.modified_count == len(ops):
+            return []
+        held = await self.collection.find(
+            {"id": {"$in": list(lines)}, "reservations": reservation_id}, {"_id": 0, "id": 1}
+        ).to_list(len(lines))
+        held_ids = {product["id"] for product in held}
+        short = [pid for pid in lines if pid not in held_ids]
+        if short:
+            await self.release_stock(reservation_id, lines)
+        return short
+
+    async def release_stock(self, reservation_id, lines):
+        now = _now()
+        ops = [
+            UpdateOne(
+                {"id": pid, "reservations": reservation_id},
+                {"$inc": {"stock": qty, "version": 1}, "$set": {"stockUpdatedAt": now}, "$pull": {"reservations": reservation_id}}
+            )
+            for pid, qty in lines.items()
+        ]
+        await self.collection.bulk_write(ops, ordered=False)
+
+    async def settle_stock(self, reservation_id, lines):
+        await self.collection.update_many(
+            {"id": {"$in": list(lines)}, "reservations": reservation_id},
+            {"$pull": {"reservations": reservation_id}}
+        )
+
+class MotorCarts:
+    def __init__(self, db, reads=None):
+        self.collection = db.carts
+
+    async def get(self, user_id):
+        return await self.collection.find_one({"userId": user_id}, {"_id": 0})
+
+    async def save(self, cart):
+        await self.collection.update_one({"userId": cart["userId"]}, {"$set": cart}, upsert=True)
+
+    async def apply(self, user_id, replace, ops, updated_at):
+        # One atomic pipeline update: optionally replace the items, then one
+        # stage per product operation, then drop items whose quantity hit 0
+        items = {"$literal": replace} if replace is not None else {"$ifNull": ["$items", []]}
+        stages = [{"$set": {"items": items}}]
+        for product_id, (kind, quantity) in ops.items():
+            pid = {"$literal": product_id}
+            new_quantity = quantity if kind == "set" else {"$add": ["$$item.quantity", quantity]}
+            stages.append({"$set": {"items": {"$cond": [
+                {"$in": [pid, "$items.productId"]},
+                {"$map": {"input": "$items", "as": "item", "in": {"$cond": [
+                    {"$eq": ["$$item.productId", pid]},
+                    {"productId": pid, "quantity": new_quantity},
+                    "$$item",
+                ]}}},
+                {"$concatArrays": ["$items", [{"productId": pid, "quantity": quantity}]]},
+            ]}}})
+        stages.append({"$set": {
+            "items": {"$filter": {"input": "$items", "as": "item", "cond": {"$gt": ["$$item.quantity", 0]}}},
+            "updatedAt": {"$literal": updated_at},
+        }})
+        return await self.collection.find_one_and_update(
+            {"userId": user_id},
+            stages,
+            projection={"_id": 0},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, user_id, before=None):
+        # `before`: only if the cart was not changed after this time
+        query = {"userId": user_id}
+        if before is not None:
+            query["updatedAt"] = {"$lte": before}
+        await self.collection.delete_one(query)
+
+class MotorOrders:
+    def __init__(self, db, reads=None):
+        self.collection = db.orders
+        self.reads = (db if reads is None else reads).orders
+
+    async def get(self, order_id, user_id=None):
+        query = {"orderId": order_id}
+        if user_id is not None:
+            query["userId"] = user_id
+        return await self.collection.find_one(query, {"_id": 0})
+
+    async def insert(self, order):
+        await self.collection.insert_one(dict(order))
+
+    async def list(self, fields, limit, after=None, user_id=None):
+        # A customer's own list must show the order they just placed; the
+        # admin list over all orders tolerates replication lag
+        if user_id is not None:
+            query, collection = {"userId": user_id}, self.collection
+        else:
+            query, collection = {}, self.reads
+        query = _after(query, after, ORDER_SORT)
+        return await collection.find(query, _projection(fields)).sort(ORDER_SORT).limit(limit).to_list(limit)
+
+    async def iter_items(self):
+        # The products of every order, for the co-purchase recommender
+        async for order in self.reads.find({}, {"_id": 0, "orderId": 1, "items.productId": 1}).batch_size(5000):
+            yield order
+
+    async def set_status(self, order_id, status):
+        return await self.collection.find_one_and_update(
+            {"orderId": order_id},
+            {"$set": {"status": status}},
+            projection={"_id": 0, "status": 1, "total": 1},
+            return_document=ReturnDocument.BEFORE
+        )
+
+class MotorReservations:
+    def __init__(self, db, reads=None):
+        self.collection = db.reservations
+
+    async def insert(self, reservation):
+        await self.collection.insert_one(dict(reservation))
+
+    async def claim(self, reservation_id, user_id, now, until):
+        return await self.collection.find_one_and_update(
+            {"id": reservation_id, "userId": user_id, "expiresAt": {"$gt": now}, "expired": {"$ne": True}},
+            {"$set": {"expiresAt": until}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def lease_expired(self, now, until):
+        # Marks the reservation expired, so it can no longer be claimed, and
+        # hides it from other sweeps until `until`
+        return await self.collection.find_one_and_update(
+            {"expiresAt": {"$lte": now}},
+            {"$set": {"expiresAt": until, "expired": True}},
+            projection={"_id": 0},
+            sort=[("expiresAt", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def delete(self, reservation_id):
+        await self.collection.delete_one({"id": reservation_id})
+
+class MotorJobs:
+    def __init__(self, db, reads=None):
+        self.collection = db.jobs
+
+    async def insert_many(self, jobs):
+        # In order, stopping at the first failure: a job is only queued if
+        # every job before it was
+        await self.collection.insert_many([dict(job) for job in jobs])
+
+    async def claim(self, now, until, limit, token):
+        # Three round trips regardless of batch size: pick due ids, claim the
+        # ones still due, read back what this token won
+        due = await self.collection.find({"runAt": {"$lte": now}}, {"_id": 0, "id": 1}).sort("runAt", 1).limit(limit).to_list(limit)
+        if not due:
+            return []
+        ids = [job["id"] for job in due]
+        await self.collection.update_many(
+            {"id": {"$in": ids}, "runAt": {"$lte": now}},
+            {"$set": {"runAt": until, "status": "running", "claim": token}, "$inc": {"attempts": 1}}
+        )
+        return await self.collection.find({"id": {"$in": ids}, "claim": token}, {"_id": 0}).to_list(limit)
+
+    async def complete(self, job_ids):
+        await self.collection.delete_many({"id": {"$in": list(job_ids)}})
+
+    async def retry(self, job_id, run_at, error):
+        await self.collection.update_one(
+            {"id": job_id}, {"$set": {"runAt": run_at, "status": "pending", "error": error}}
+        )
+
+    async def bury(self, job_id, error):
+        await self.collection.update_one(
+            {"id": job_id}, {"$set": {"status": "dead", "error": error}, "$unset": {"runAt": ""}}
+        )
+
+    async def counts(self):
+        rows = await self.collection.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+        return {row["_id"]: row["count"] for row in rows}
+
+class MotorStats:
+    def __init__(self, db, reads=None):
+        self.db = db
+        self.reads = db if reads is None else reads
+
+    async def increment(self, fields, once=None):
+        # With `once` (ids), applies only if none of them was applied before;
+        # returns whether it applied
+        if not once:
+            await self.db.stats.update_one({"_id": STATS_ID}, {"$inc": fields}, upsert=True)
+            return True
+        try:
+            await self.db.stats.update_one(
+                {"_id": STATS_ID, "applied": {"$nin": list(once)}},
+                {"$inc": fields, "$push": {"applied": {"$each": list(once), "$slice": -APPLIED_WINDOW}}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            # The document exists, so the filter failed on `applied`
+            return False
+        return True
+
+    async def get(self):
+        return await self.reads.stats.find_one({"_id": STATS_ID}, {"_id": 0, "applied": 0}) or {}
+
+    async def rebuild(self):
+        return await rebuild_stats(self.db)
+
+    async def ensure(self):
+        if await self.db.stats.count_documents({"_id": STATS_ID}, limit=1) == 0:
+            await self.rebuild()
+
+class MotorStorage:
+    """Writes, auth, carts, stock and a customer's own orders use `db`, the
+    primary. Catalog reads and admin analytics use `reads`, which may be the
+    same database with a secondary read preference. Without a database the
+    repositories are created by `attach` once the client is connected."""
+
+    engine = "mongo"
+
+    def __init__(self, db=None, reads=None):
+        if db is not None:
+            self.attach(db, reads)
+
+    def attach(self, db, reads=None):
+        self.db = db
+        self.reads = reads if reads is not None else db
+        self.users = MotorUsers(db, self.reads)
+        self.products = MotorProducts(db, self.reads)
+        self.carts = MotorCarts(db, self.reads)
+        self.orders = MotorOrders(db, self.reads)
+        self.reservations = MotorReservations(db, self.reads)
+        self.jobs = MotorJobs(db, self.reads)
+        self.stats = MotorStats(db, self.reads)
+
+    async def prepare(self):
+        await ensure_indexes(self.db)
+        await self.stats.ensure()
+
+    async def stream(self, collection, date_field, sort, exclude=(), since=None, until=None, batch_size=1000):
+        projection = {"_id": 0, **{field: 0 for field in exclude}}
+        cursor = self.reads[collection].find(_date_range(date_field, since, until), projection)
+        async for doc in cursor.sort(sort).batch_size(batch_size):
+            yield doc
+
+# In-memory engine
+
+class SortedIndex:
+    """Sorted list of key tuples supporting range scans in either direction."""
+
+    def __init__(self):
+        self.keys = []
+
+    def __len__(self):
+        return len(self.keys)
+
+    def add(self, key):
+        bisect.insort(self.keys, key)
+
+    def remove(self, key):
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    def descending(self, before=None):
+        end = len(self.keys) if before is None else bisect.bisect_left(self.keys, before)
+        for i in range(end - 1, -1, -1):
+            yield self.keys[i]
+
+    def ascending(self, low=None, high=None):
+        start = 0 if low is None else bisect.bisect_left(self.keys, low)
+        end = len(self.keys) if high is None else bisect.bisect_left(self.keys, high)
+        return self.keys[start:end]
+
+def _key(doc, sort):
+    return tuple(doc[field] for field, _ in sort)
+
+def _pick(doc, fields, slices=None):
+    picked = {field: doc[field] for field in fields if field in doc}
+    for field, n in (slices or {}).items():
+        if isinstance(picked.get(field), list):
+            picked[field] = picked[field][:n]
+    return picked
+
+def _scan(index, docs, sort, fields, limit, after=None, match=None, slices=None):
+    # All listing sorts are descending on every key, so walking the index
+    # backwards from the cursor yields the next page directly
+    before = _key(after, sort) if after else None
+    page = []
+    for key in index.descending(before):
+        doc = docs[key[-1]]
+        if match is None or match(doc):
+            page.append(_pick(doc, fields, slices))
+            if len(page) == limit:
+                break
+    return page
+
+class MemoryUsers:
+    def __init__(self):
+        self.docs = {}
+        self.by_email = {}
+        self.by_created = SortedIndex()
+
+    async def get(self, user_id):
+        user = self.docs.get(user_id)
+        return {k: v for k, v in user.items() if k != "password"} if user else None
+
+    async def get_by_email(self, email):
+        user_id = self.by_email.get(email)
+        return dict(self.docs[user_id]) if user_id else None
+
+    async def insert(self, user):
+        if user["email"] in self.by_email or user["id"] in self.docs:
+            raise DuplicateKeyError("duplicate user")
+        self.docs[user["id"]] = dict(user)
+        self.by_email[user["email"]] = user["id"]
+        self.by_created.add(_key(user, USER_SORT))
+
+    async def list(self, fields, limit, after=None):
+        return _scan(self.by_created, self.docs, USER_SORT, fields, limit, after)
+
+    async def set_role(self, user_id, role):
+        user = self.docs.get(user_id)
+        if user is None:
+            return None
+        previous = {"role": user["role"]}
+        user["role"] = role
+        user["updatedAt"] = _now()
+        return previous
+
+class MemoryProducts:
+    FILTER_FIELDS = ("category", "fragrance", "featured")
+
+    def __init__(self):
+        self.docs = {}
+        self.by_sku = {}
+        self.by_date = SortedIndex()
+        self.by_field = {field: defaultdict(SortedIndex) for field in self.FILTER_FIELDS}
+
+    def _index(self, product):
+        key = _key(product, PRODUCT_SORT)
+        self.by_sku[product.get("sku")] = product["id"]
+        self.by_date.add(key)
+        for field in self.FILTER_FIELDS:
+            self.by_field[field][product.get(field)].add(key)
+
+    def _unindex(self, product):
+        key = _key(product, PRODUCT_SORT)
+        self.by_sku.pop(product.get("sku"), None)
+        self.by_date.remove(key)
+        for field in self.FILTER_FIELDS:
+            self.by_field[field][product.get(field)].remove(key)
+
+    async def get(self, product_id, primary=False):
+        product = self.docs.get(product_id)
+        return dict(product) if product else None
+
+    async def get_many(self, product_ids):
+        return [dict(self.docs[pid]) for pid in dict.fromkeys(product_ids) if pid in self.docs]
+
+    async def list(self, filters, fields, limit, after=None, slices=None, primary=False):
+        def match(product):
+            for field in self.FILTER_FIELDS:
+                if filters.get(field) is not None and product.get(field) != filters[field]:
+                    return False
+            if filters.get("minPrice") is not None and product["price"] < filters["minPrice"]:
+                return False
+            if filters.get("maxPrice") is not None and product["price"] > filters["maxPrice"]:
+                return False
+            return True
+
+        if filters.get("ids") is not None:
+            index = SortedIndex()
+            index.keys = sorted(_key(self.docs[pid], PRODUCT_SORT) for pid in set(filters["ids"]) if pid in self.docs)
+        else:
+            # Scan the narrowest index that satisfies an equality filter
+            candidates = [self.by_date] + [
+                self.by_field[field].get(filters[field], SortedIndex())
+                for field in self.FILTER_FIELDS if filters.get(field) is not None
+            ]
+            index = min(candidates, key=len)
+        return _scan(index, self.docs, PRODUCT_SORT, fields, limit, after, match, slices)
+
+    async def iter_all(self, fields):
+        for product in list(self.docs.values()):
+            yield _pick(product, fields)
+
+    async def facets(self, filters, price_bounds, primary=False):
+        matching = await self.list(filters, ["price", *FACET_FIELDS], len(self.docs) or 1)
+        counts = {field: defaultdict(int) for field in FACET_FIELDS}
+        price_counts = defaultdict(int)
+        for product in matching:
+            for field in FACET_FIELDS:
+                counts[field][product.get(field)] += 1
+            i = bisect.bisect_right(price_bounds, product["price"]) - 1
+            if i >= 0:
+                price_counts[price_bounds[i]] += 1
+        return facet_result(len(matching), counts, price_bounds, price_counts)
+
+    async def insert(self, product):
+        if product["id"] in self.docs or product.get("sku") in self.by_sku:
+            raise DuplicateKeyError("duplicate product")
+        self.docs[product["id"]] = dict(product)
+        self._index(product)
+
+    async def update(self, product_id, changes):
+        product = self.docs.get(product_id)
+        if product is None:
+            return None
+        self._unindex(product)
+        product.update({"updatedAt": _now(), **changes})
+        product["version"] = product.get("version", 0) + 1
+        self._index(product)
+        return dict(product)
+
+    async def delete(self, product_id):
+        product = self.docs.pop(product_id, None)
+        if product is None:
+            return False
+        self._unindex(product)
+        return True
+
+    async def upsert_many(self, products):
+        inserted = updated = 0
+        for product in products:
+            existing = self.by_sku.get(product["sku"])
+            if existing:
+                await self.update(existing, {k: v for k, v in product.items() if k not in INSERT_ONLY_FIELDS})
+                updated += 1
+            else:
+                await self.insert(product)
+                inserted += 1
+        return inserted, updated, {}
+
+    async def reserve_stock(self, reservation_id, lines):
+        # No awaits between the check and the decrement, so this is atomic
+        pending = {
+            pid: qty for pid, qty in lines.items()
+            if pid not in self.docs or reservation_id not in self.docs[pid].get("reservations", ())
+        }
+        short = [pid for pid, qty in pending.items() if pid not in self.docs or self.docs[pid].get("stock", 0) < qty]
+        if short:
+            await self.release_stock(reservation_id, lines)
+            return short
+        now = _now()
+        for pid, qty in pending.items():
+            product = self.docs[pid]
+            product.update(stock=product["stock"] - qty, version=product.get("version", 0) + 1, stockUpdatedAt=now)
+            product["reservations"] = product.get("reservations", []) + [reservation_id]
+        return []
+
+    async def release_stock(self, reservation_id, lines):
+        for pid, qty in lines.items():
+            product = self.docs.get(pid)
+            if product and reservation_id in product.get("reservations", ()):
+                product.update(stock=product["stock"] + qty, version=product.get("version", 0) + 1, stockUpdatedAt=_now())
+                product["reservations"] = [r for r in product["reservations"] if r != reservation_id]
+
+    async def settle_stock(self, reservation_id, lines):
+        for pid in lines:
+            product = self.docs.get(pid)
+            if product and reservation_id in product.get("reservations", ()):
+                product["reservations"] = [r for r in product["reservations"] if r != reservation_id]
+
+class MemoryCarts:
+    def __init__(self):
+        self.docs = {}
+
+    async def get(self, user_id):
+        cart = self.docs.get(user_id)
+        return dict(cart) if cart else None
+
+    async def save(self, cart):
+        self.docs.setdefault(cart["userId"], {}).update(cart)
+
+    async def apply(self, user_id, replace, ops, updated_at):
+        cart = self.docs.setdefault(user_id, {"userId": user_id, "items": []})
+        items = [dict(item) for item in (replace if replace is not None else cart.get("items", []))]
+        positions = {item["productId"]: i for i, item in enumerate(items)}
+        for product_id, (kind, quantity) in ops.items():
+            if product_id in positions:
+                item = items[positions[product_id]]
+                item["quantity"] = quantity if kind == "set" else item["quantity"] + quantity
+            else:
+                positions[product_id] = len(items)
+                items.append({"productId": product_id, "quantity": quantity})
+        cart["items"] = [item for item in items if item["quantity"] > 0]
+        cart["updatedAt"] = updated_at
+        return dict(cart)
+
+    async def delete(self, user_id, before=None):
+        cart = self.docs.get(user_id)
+        if cart and (before is None or cart.get("updatedAt", "") <= before):
+            del self.docs[user_id]
+
+class MemoryOrders:
+    def __init__(self):
+        self.docs = {}
+        self.by_date = SortedIndex()
+        self.by_user = defaultdict(SortedIndex)
+
+    async def get(self, order_id, user_id=None):
+        order = self.docs.get(order_id)
+        if order is None or (user_id is not None and order["userId"] != user_id):
+            return None
+        return dict(order)
+
+    async def insert(self, order):
+        if order["orderId"] in self.docs:
+            raise DuplicateKeyError("duplicate order")
+        self.docs[order["orderId"]] = dict(order)
+        key = _key(order, ORDER_SORT)
+        self.by_date.add(key)
+        self.by_user[order["userId"]].add(key)
+
+    async def list(self, fields, limit, after=None, user_id=None):
+        index = self.by_date if user_id is None else self.by_user.get(user_id, SortedIndex())
+        return _scan(index, self.docs, ORDER_SORT, fields, limit, after)
+
+    async def iter_items(self):
+        for order in list(self.docs.values()):
+            yield {"orderId": order["orderId"], "items": [{"productId": item["productId"]} for item in order["items"]]}
+
+    async def set_status(self, order_id, status):
+        order = self.docs.get(order_id)
+        if order is None:
+            return None
+        previous = {"status": order["status"], "total": order["total"]}
+        order["status"] = status
+        return previous
+
+class MemoryReservations:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert(self, reservation):
+        if reservation["id"] in self.docs:
+            raise DuplicateKeyError("duplicate reservation")
+        self.docs[reservation["id"]] = dict(reservation)
+
+    async def claim(self, reservation_id, user_id, now, until):
+        reservation = self.docs.get(reservation_id)
+        if reservation is None or reservation["userId"] != user_id or reservation["expiresAt"] <= now or reservation.get("expired"):
+            return None
+        reservation["expiresAt"] = until
+        return dict(reservation)
+
+    async def lease_expired(self, now, until):
+        expired = [r for r in self.docs.values() if r["expiresAt"] <= now]
+        if not expired:
+            return None
+        reservation = min(expired, key=lambda r: r["expiresAt"])
+        reservation.update(expiresAt=until, expired=True)
+        return dict(reservation)
+
+    async def delete(self, reservation_id):
+        self.docs.pop(reservation_id, None)
+
+class MemoryJobs:
+    def __init__(self):
+        self.docs = {}
+
+    async def insert_many(self, jobs):
+        for job in jobs:
+            self.docs[job["id"]] = dict(job)
+
+    async def claim(self, now, until, limit, token):
+        due = sorted((job for job in self.docs.values() if job.get("runAt") and job["runAt"] <= now), key=lambda job: job["runAt"])
+        claimed = []
+        for job in due[:limit]:
+            job.update(runAt=until, status="running", claim=token, attempts=job["attempts"] + 1)
+            claimed.append(dict(job))
+        return claimed
+
+    async def complete(self, job_ids):
+        for job_id in job_ids:
+            self.docs.pop(job_id, None)
+
+    async def retry(self, job_id, run_at, error):
+        if job_id in self.docs:
+            self.docs[job_id].update(runAt=run_at, status="pending", error=error)
+
+    async def bury(self, job_id, error):
+        job = self.docs.get(job_id)
+        if job:
+            job.update(status="dead", error=error)
+            job.pop("runAt", None)
+
+    async def counts(self):
+        counts = defaultdict(int)
+        for job in self.docs.values():
+            counts[job["status"]] += 1
+        return dict(counts)
+
+class MemoryStats:
+    def __init__(self, storage):
+        self.storage = storage
+        self.doc = {}
+
+    async def increment(self, fields, once=None):
+        if once:
+            applied = self.doc.setdefault("applied", [])
+            if any(key in applied for key in once):
+                return False
+            applied.extend(once)
+            del applied[:-APPLIED_WINDOW]
+        for path, amount in fields.items():
+            *parents, leaf = path.split(".")
+            target = self.doc
+            for part in parents:
+                target = target.setdefault(part, {})
+            target[leaf] = target.get(leaf, 0) + amount
+        return True
+
+    async def get(self):
+        return {key: value for key, value in self.doc.items() if key != "applied"}
+
+    async def rebuild(self):
+        orders = self.storage.orders.docs.values()
+        by_status, by_role = defaultdict(int), defaultdict(int)
+        for order in orders:
+            by_status[order["status"]] += 1
+        for user in self.storage.users.docs.values():
+            by_role[user["role"]] += 1
+        self.doc = {
+            "totalOrders": len(orders),
+            "totalSales": sum(o["total"] for o in orders if o["status"] != CANCELLED),
+            "ordersByStatus": dict(by_status),
+            "usersByRole": dict(by_role),
+            "totalProducts": len(self.storage.products.docs),
+        }
+        # The newest counted orders, so their queued jobs do not count them again
+        recent = sorted(orders, key=lambda o: _key(o, ORDER_SORT), reverse=True)[:APPLIED_WINDOW]
+        self.doc["applied"] = [order["orderId"] for order in reversed(recent)]
+        return await self.get()
+
+    async def ensure(self):
+        if not self.doc:
+            await self.rebuild()
+
+class MemoryStorage:
+    engine = "memory"
+
+    def __init__(self):
+        self.users = MemoryUsers()
+        self.products = MemoryProducts()
+        self.carts = MemoryCarts()
+        self.orders = MemoryOrders()
+        self.reservations = MemoryReservations()
+        self.jobs = MemoryJobs()
+        self.stats = MemoryStats(self)
+        self._collections = {
+            "users": self.users.docs,
+            "products": self.products.docs,
+            "orders": self.orders.docs,
+            "carts": self.carts.docs,
+        }
+
+    async def prepare(self):
+        await self.stats.ensure()
+
+    async def load_from(self, db):
+        # Snapshot the MongoDB collections into memory
+        repositories = {
+            "users": self.users, "products": self.products,
+            "orders": self.orders, "reservations": self.reservations,
+        }
+        for name, repository in repositories.items():
+            async for doc in db[name].find({}, {"_id": 0}):
+                await repository.insert(doc)
+        async for cart in db.carts.find({}, {"_id": 0}):
+            await self.carts.save(cart)
+        await self.stats.rebuild()
+        logger.info(
+            "Loaded %d users, %d products, %d orders into memory",
+            len(self.users.docs), len(self.products.docs), len(self.orders.docs)
+        )
+
+    async def stream(self, collection, date_field, sort, exclude=(), since=None, until=None, batch_size=1000):
+        docs = [
+            doc for doc in self._collections[collection].values()
+            if (since is None or doc[date_field] >= since) and (until is None or doc[date_field] < until)
+        ]
+        docs.sort(key=lambda doc: _key(doc, sort))
+        for doc in docs:
+            yield {k: v for k, v in doc.items() if k not in exclude}
@@ -0,0 +1,34 @@
+import os
+import sys
+from pathlib import Path
+
+# The backend modules import each other by bare name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# server.py reads these at import; the memory engine never connects to MONGO_URL
+os.environ.setdefault("STORAGE_ENGINE", "memory")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ.setdefault("DB_NAME", "test_database")
+os.environ.setdefault("CHANGE_FEED", "0")
+os.environ.setdefault("LOOP_MONITOR", "0")
+os.environ.setdefault("PASSWORD_HASH_WORKERS", "0")
+
+def make_product(product_id, stock=5, dateAdded="2026-01-01T00:00:00+00:00", **fields):
+    return {
+        "id": product_id,
+        "name": f"Candle {product_id}",
+        "description": "Test candle",
+        "price": 100.0,
+        "category": "jar",
+        "fragrance": "vanilla",
+        "size": "medium",
+        "weight": "200g",
+        "burnTime": "40 hours",
+        "stock": stock,
+        "images": [],
+        "sku": f"SKU-{product_id}",
+        "featured": False,
+        "dateAdded": dateAdded,
+        "version": 0,
+        **fields,
+    }
@@ -0,0 +1,102 @@
+from cache import CatalogCache, TTLCache
+
+def listing(*ids):
+    return [{"id": product_id, "version": 1} for product_id in ids]
+
+def test_stock_move_evicts_the_product_and_listings_showing_it():
+    cache = CatalogCache()
+    snapshot = cache.snapshot()
+    cache.put_product({"id": "a"}, snapshot)
+    cache.put_product({"id": "b"}, snapshot)
+    cache.put_listing("page1", listing("a", "b"), snapshot)
+    cache.put_listing("page2", listing("c"), snapshot)
+    cache.put_facets("all", {"total": 3}, snapshot)
+
+    cache.stock_changed(["a"])
+    assert cache.get_product("a") is None
+    assert cache.get_listing("page1") is None
+    assert cache.get_product("b") == {"id": "b"}
+    assert cache.get_listing("page2") == listing("c")
+    assert cache.get_facets("all") == {"total": 3}
+
+def test_stock_move_fails_only_fills_holding_the_moved_product():
+    cache = CatalogCache()
+    snapshot = cache.snapshot()
+    cache.stock_changed(["a"])
+    cache.put_product({"id": "a"}, snapshot)
+    cache.put_listing("with-a", listing("b", "a"), snapshot)
+    cache.put_product({"id": "b"}, snapshot)
+    cache.put_listing("without-a", listing("b", "c"), snapshot)
+    cache.put_facets("all", {"total": 3}, snapshot)
+    assert cache.get_product("a") is None
+    assert cache.get_listing("with-a") is None
+    assert cache.get_product("b") == {"id": "b"}
+    assert cache.get_listing("without-a") == listing("b", "c")
+    assert cache.get_facets("all") == {"total": 3}
+
+    # A read that starts after the move may fill
+    cache.put_product({"id": "a"}, cache.snapshot())
+    assert cache.get_product("a") == {"id": "a"}
+
+def test_listing_index_survives_pruning():
+    cache = CatalogCache(maxsize=4)
+    for i in range(10):
+        cache.put_listing(f"page{i}", listing(f"p{i}", "shared"), cache.snapshot())
+    assert len(cache.listed["shared"]) <= 2 * cache.listings.maxsize
+    cache.stock_changed(["shared"])
+    assert len(cache.listings) == 0
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_ttl_cache_expires_and_evicts_least_recently_used():
+    clock = Clock()
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)
+    assert "b" not in cache and cache.get("a") == 1
+    clock.now = 10
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+def test_product_writes_invalidate_and_fail_older_fills():
+    cache = CatalogCache()
+    snapshot = cache.snapshot()
+    cache.put_product({"id": "a"}, snapshot)
+    cache.put_product({"id": "b"}, snapshot)
+    cache.put_listing("page", listing("a"), snapshot)
+    cache.put_facets("all", {"total": 2}, snapshot)
+
+    cache.product_updated("a")
+    assert cache.get_product("a") is None
+    assert cache.get_product("b") == {"id": "b"}
+    assert cache.get_listing("page") is None
+    assert cache.get_facets("all") is None
+
+    # A read that started before the write cannot put back what it saw
+    cache.put_product({"id": "a"}, snapshot)
+    cache.put_facets("all", {"total": 2}, snapshot)
+    assert cache.get_product("a") is None
+    assert cache.get_facets("all") is None
+
+def test_created_product_clears_listings_but_keeps_products():
+    cache = CatalogCache()
+    cache.put_product({"id": "a"}, cache.snapshot())
+    cache.put_listing("page", listing("a"), cache.snapshot())
+    cache.product_created("b")
+    assert cache.get_listing("page") is None
+    assert cache.get_product("a") == {"id": "a"}
+
+def test_deleted_product_evicts_only_listings_containing_it():
+    cache = CatalogCache()
+    cache.put_listing("with-a", listing("a", "b"), cache.snapshot())
+    cache.put_listing("without-a", listing("b"), cache.snapshot())
+    cache.product_deleted("a")
+    assert cache.get_listing("with-a") is None
+    assert cache.get_listing("without-a") == listing("b")
@@ -0,0 +1,79 @@
+import asyncio
+from carts import CartCoalescer, merge_op
+from storage import MemoryStorage
+
+def quantities(cart):
+    return {item["productId"]: item["quantity"] for item in cart["items"]}
+
+def test_merge_op_folds_adds_into_the_previous_operation():
+    ops = {}
+    merge_op(ops, "a", "add", 1)
+    merge_op(ops, "a", "add", 2)
+    merge_op(ops, "b", "set", 5)
+    merge_op(ops, "b", "add", 1)
+    assert ops == {"a": ("add", 3), "b": ("set", 6)}
+    merge_op(ops, "a", "set", 0)
+    assert ops["a"] == ("set", 0)
+
+def test_concurrent_mutations_are_written_once():
+    storage = MemoryStorage()
+    carts = CartCoalescer(storage, delay=0.01)
+
+    async def scenario():
+        return await asyncio.gather(
+            carts.add("u1", "a", 1), carts.add("u1", "a", 2), carts.add("u1", "b", 1), carts.remove("u1", "b"),
+        )
+
+    results = asyncio.run(scenario())
+    assert all(quantities(cart) == {"a": 3} for cart in results)
+    assert carts.stats() == {"mutations": 4, "writes": 1, "pending": 0}
+
+def test_replace_then_add_in_one_window():
+    storage = MemoryStorage()
+    carts = CartCoalescer(storage, delay=0.01)
+
+    async def scenario():
+        await carts.add("u1", "old", 1)
+        _, added = await asyncio.gather(
+            carts.replace("u1", [{"productId": "a", "quantity": 2}]), carts.add("u1", "a", 1),
+        )
+        return added
+
+    assert quantities(asyncio.run(scenario())) == {"a": 3}
+
+def test_mutations_during_a_write_go_into_the_next_batch():
+    storage = MemoryStorage()
+    carts = CartCoalescer(storage, delay=0.01)
+    apply = storage.carts.apply
+
+    async def slow_apply(*args):
+        await asyncio.sleep(0.03)
+        return await apply(*args)
+
+    storage.carts.apply = slow_apply
+
+    async def scenario():
+        first = asyncio.create_task(carts.add("u1", "a", 1))
+        await asyncio.sleep(0.02)
+        # The first batch is being written; this one waits for it
+        second = await carts.set_quantity("u1", "a", 5)
+        return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert quantities(first) == {"a": 1}
+    assert quantities(second) == {"a": 5}
+    assert carts.writes == 2
+
+def test_a_failed_write_reaches_every_caller():
+    storage = MemoryStorage()
+    carts = CartCoalescer(storage, delay=0.01)
+
+    async def failing_apply(*args):
+        raise RuntimeError("write failed")
+
+    storage.carts.apply = failing_apply
+
+    async def scenario():
+        return await asyncio.gather(carts.add("u1", "a", 1), carts.add("u1", "b", 1), return_exceptions=True)
+
+    assert [str(result) for result in asyncio.run(scenario())] == ["write failed", "write failed"]
@@ -0,0 +1,93 @@
+import asyncio
+from changefeed import ChangeFeed
+from search import SearchIndex, build_search_index
+
+class Stream:
+    def __init__(self, changes):
+        self.changes = list(changes)
+        self.resume_token = "token"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    async def try_next(self):
+        if not self.changes:
+            raise asyncio.CancelledError
+        return self.changes.pop(0)
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iter()
+
+    async def _iter(self):
+        for doc in self.docs:
+            yield doc
+
+class Collection:
+    def __init__(self, docs, changes):
+        self.docs = docs
+        self.changes = changes
+
+    def find(self, query, projection):
+        return Cursor(self.docs)
+
+    def watch(self, pipeline, **options):
+        return Stream(self.changes)
+
+def follow(existing, changes):
+    received = []
+
+    async def handler(kind, doc):
+        received.append((kind, doc))
+
+    feed = ChangeFeed()
+    feed.subscribe("products", handler, fields=["id", "name"], key="id")
+    feed.db = {"products": Collection(existing, changes)}
+    try:
+        asyncio.run(feed._stream(feed.subscriptions["products"]))
+    except asyncio.CancelledError:
+        pass
+    return received
+
+def test_deletes_carry_the_key_of_the_deleted_document():
+    received = follow([{"_id": 1, "id": "old"}], [
+        {"operationType": "insert", "fullDocument": {"_id": 2, "id": "new", "name": "Fig"}},
+        {"operationType": "delete", "documentKey": {"_id": 2}},
+        {"operationType": "delete", "documentKey": {"_id": 1}},
+        {"operationType": "delete", "documentKey": {"_id": 3}},
+    ])
+    assert received == [
+        ("insert", {"id": "new", "name": "Fig"}),
+        ("delete", {"id": "new"}),
+        ("delete", {"id": "old"}),
+        ("delete", None),
+    ]
+
+class SlowProducts:
+    async def iter_all(self, fields):
+        for i in range(3):
+            await asyncio.sleep(0)
+            yield {"id": f"p{i}", "name": "Cedar candle"}
+
+def test_rebuild_swaps_in_a_complete_index():
+    products = SlowProducts()
+    index = SearchIndex()
+    index.add({"id": "gone", "name": "Cedar candle"})
+    seen = []
+
+    async def rebuild():
+        task = asyncio.create_task(build_search_index(index, products))
+        while not task.done():
+            seen.append(len(index.search("cedar")))
+            await asyncio.sleep(0)
+        await task
+
+    asyncio.run(rebuild())
+    assert len(seen) > 3 and set(seen) == {1}
+    assert sorted(index.search("cedar")) == ["p0", "p1", "p2"]
@@ -0,0 +1,54 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from conftest import make_product
+from conditional import http_date, listing_etag, not_modified, product_etag
+import server
+
+def test_product_etag_follows_the_version():
+    assert product_etag({"id": "a", "version": 3}) == '"a.3"'
+
+def test_listing_etag_covers_versions_order_and_variant():
+    page = [{"id": "a", "version": 1}, {"id": "b", "version": 1}]
+    etag = listing_etag(page)
+    assert listing_etag([page[0], {"id": "b", "version": 2}]) != etag
+    assert listing_etag(page[::-1]) != etag
+    assert listing_etag(page, "name,price") != etag
+    assert listing_etag([dict(p) for p in page]) == etag
+
+def test_if_none_match_takes_precedence():
+    etag, modified = '"a.1"', "2026-01-01T10:00:00+00:00"
+    assert not_modified({"if-none-match": 'W/"a.1", "b.2"'}, etag)
+    assert not_modified({"if-none-match": "*"}, etag)
+    assert not not_modified({"if-none-match": '"a.0"', "if-modified-since": http_date(modified)}, etag, modified)
+
+def test_if_modified_since_compares_whole_seconds():
+    modified = "2026-01-01T10:00:00.750000+00:00"
+    assert http_date(modified) == "Thu, 01 Jan 2026 10:00:00 GMT"
+    assert not_modified({"if-modified-since": "Thu, 01 Jan 2026 10:00:00 GMT"}, '"a.1"', modified)
+    assert not not_modified({"if-modified-since": "Thu, 01 Jan 2026 09:59:59 GMT"}, '"a.1"', modified)
+    assert not not_modified({"if-modified-since": "garbage"}, '"a.1"', modified)
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+def test_stock_move_changes_product_and_listing_etags(client):
+    category = f"cat-{uuid.uuid4().hex[:8]}"
+    product_id = f"etag-{uuid.uuid4().hex[:8]}"
+    asyncio.run(server.storage.products.insert(make_product(product_id, stock=1, category=category)))
+
+    listing = client.get("/api/products", params={"category": category})
+    product = client.get(f"/api/products/{product_id}")
+    assert listing.json()[0]["stock"] == product.json()["stock"] == 1
+    assert client.get(f"/api/products/{product_id}", headers={"If-None-Match": product.headers["etag"]}).status_code == 304
+    assert client.get("/api/products", params={"category": category}, headers={"If-None-Match": listing.headers["etag"]}).status_code == 304
+
+    asyncio.run(server.inventory.reserve("etag-order", "u1", {product_id: 1}))
+
+    listing_after = client.get("/api/products", params={"category": category}, headers={"If-None-Match": listing.headers["etag"]})
+    product_after = client.get(f"/api/products/{product_id}", headers={"If-None-Match": product.headers["etag"]})
+    assert listing_after.status_code == product_after.status_code == 200
+    assert listing_after.json()[0]["stock"] == product_after.json()["stock"] == 0
@@ -0,0 +1,43 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from conftest import make_product
+import server
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+@pytest.fixture
+def category():
+    category = f"cat-{uuid.uuid4().hex[:8]}"
+    asyncio.run(server.storage.products.insert(make_product(
+        f"{category}-1", category=category, images=["a.jpg", "b.jpg", "c.jpg"],
+    )))
+    return category
+
+def test_fields_select_the_returned_fields(client, category):
+    [product] = client.get("/api/products", params={"category": category, "fields": "name,price"}).json()
+    assert set(product) == {"id", "name", "price"}
+    [product] = client.get("/api/products", params={"category": category, "imageLimit": 1}).json()
+    assert product["images"] == ["a.jpg"]
+    assert "reservations" not in product
+
+def test_unknown_fields_are_rejected(client, category):
+    response = client.get("/api/products", params={"category": category, "fields": "name,secret"})
+    assert response.status_code == 400
+    assert "secret" in response.json()["detail"]
+
+def test_selection_changes_the_etag(client, category):
+    full = client.get("/api/products", params={"category": category})
+    sparse = client.get("/api/products", params={"category": category, "fields": "name"})
+    assert full.headers["etag"] != sparse.headers["etag"]
+
+def test_listing_schema_marks_only_id_required():
+    schema = server.app.openapi()
+    items = schema["paths"]["/api/products"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]["items"]
+    sparse = schema["components"]["schemas"][items["$ref"].rsplit("/", 1)[1]]
+    assert sparse["required"] == ["id"]
+    assert set(sparse["properties"]) == set(server.Product.model_fields)
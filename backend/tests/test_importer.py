@@ -0,0 +1,67 @@
+import asyncio
+import json
+import pytest
+from pymongo.errors import DuplicateKeyError
+from importer import csv_rows, import_products, ndjson_rows
+from storage import MemoryStorage
+import server
+
+async def chunked(text, size=7):
+    # Small chunks, so rows and multi-byte characters span chunk boundaries
+    data = text.encode()
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+async def collect(rows):
+    return [row async for row in rows]
+
+def row(name, **fields):
+    return {
+        "name": name, "price": 450, "category": "Jar", "size": "M", "weight": "200g",
+        "burnTime": "40h", "stock": 3, "images": ["a.jpg"], "description": "Hand poured", **fields,
+    }
+
+def test_ndjson_rows_report_bad_lines_by_number():
+    text = '{"name": "Rosé"}\n\nnot json\n[1, 2]\n{"name": "Oud"}'
+    rows = asyncio.run(collect(ndjson_rows(chunked(text))))
+    assert [(number, parsed) for number, parsed, _ in rows] == [(1, {"name": "Rosé"}), (3, None), (4, None), (5, {"name": "Oud"})]
+    assert rows[1][2].startswith("Invalid JSON")
+    assert rows[2][2] == "Row must be a JSON object"
+
+def test_csv_rows_handle_quotes_lists_and_short_rows():
+    text = 'name,description,images\nPine,"Two\nlines",a.jpg|b.jpg\nCedar,x,["c.jpg"]\nShort,x\n'
+    rows = asyncio.run(collect(csv_rows(chunked(text))))
+    assert rows[0] == (2, {"name": "Pine", "description": "Two\nlines", "images": ["a.jpg", "b.jpg"]}, None)
+    assert rows[1] == (4, {"name": "Cedar", "description": "x", "images": ["c.jpg"]}, None)
+    assert rows[2] == (5, None, "Expected 3 columns, got 2")
+
+def test_import_upserts_by_sku_and_reports_invalid_rows():
+    storage = MemoryStorage()
+    lines = [row("Pine", sku="PIN-1"), {"name": "Missing fields"}, row("Cedar")]
+    text = "\n".join(json.dumps(line) for line in lines)
+    report = asyncio.run(import_products(storage.products, chunked(text), "ndjson", server.import_row, batch_size=2))
+    assert (report.received, report.inserted, report.updated, report.failed) == (3, 2, 0, 1)
+    assert report.errors[0]["row"] == 2
+    assert {error["loc"] for error in report.errors[0]["errors"]} >= {"price", "category"}
+
+    # The same SKU again updates the product instead of adding one
+    text = json.dumps(row("Pine Forest", sku="PIN-1", stock=9))
+    report = asyncio.run(import_products(storage.products, chunked(text), "ndjson", server.import_row))
+    assert (report.inserted, report.updated) == (0, 1)
+    [pine] = [p for p in storage.products.docs.values() if p["sku"] == "PIN-1"]
+    assert (pine["name"], pine["stock"], pine["version"]) == ("Pine Forest", 9, 2)
+
+def test_write_errors_are_reported_against_their_rows():
+    class Products:
+        async def upsert_many(self, batch):
+            return len(batch) - 1, 0, {1: "duplicate SKU"}
+
+    text = "\n".join(json.dumps(row(name)) for name in ("A", "B", "C"))
+    report = asyncio.run(import_products(Products(), chunked(text), "ndjson", server.import_row))
+    assert report.as_dict()["errors"] == [{"row": 2, "errors": [{"loc": "", "msg": "duplicate SKU"}]}]
+
+def test_sku_is_unique():
+    storage = MemoryStorage()
+    asyncio.run(storage.products.insert(server.import_row(row("Pine", sku="PIN-1"))))
+    with pytest.raises(DuplicateKeyError):
+        asyncio.run(storage.products.insert(server.import_row(row("Other", sku="PIN-1"))))
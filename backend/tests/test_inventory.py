@@ -0,0 +1,93 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from pymongo.errors import DuplicateKeyError
+from conftest import make_product
+from inventory import Inventory, OutOfStock, ReservationNotFound
+from storage import MemoryStorage
+
+def run(coro):
+    return asyncio.run(coro)
+
+@pytest.fixture
+def storage():
+    storage = MemoryStorage()
+    run(storage.products.insert(make_product("a", stock=5)))
+    run(storage.products.insert(make_product("b", stock=1)))
+    return storage
+
+def stock(storage, product_id):
+    return storage.products.docs[product_id]["stock"]
+
+def test_reserve_takes_stock_and_commit_keeps_it(storage):
+    inventory = Inventory(storage)
+    reservation = run(inventory.reserve("r1", "u1", {"a": 2, "b": 1}))
+    assert (stock(storage, "a"), stock(storage, "b")) == (3, 0)
+    assert storage.products.docs["a"]["reservations"] == ["r1"]
+
+    run(inventory.commit(reservation))
+    assert (stock(storage, "a"), stock(storage, "b")) == (3, 0)
+    assert storage.products.docs["a"]["reservations"] == []
+    assert "r1" not in storage.reservations.docs
+
+def test_release_returns_stock_once(storage):
+    inventory = Inventory(storage)
+    reservation = run(inventory.reserve("r1", "u1", {"a": 2}))
+    run(inventory.release(reservation))
+    run(inventory.release(reservation))
+    assert stock(storage, "a") == 5
+    assert "r1" not in storage.reservations.docs
+
+def test_short_reservation_takes_nothing(storage):
+    inventory = Inventory(storage)
+    with pytest.raises(OutOfStock) as raised:
+        run(inventory.reserve("r1", "u1", {"a": 2, "b": 2}))
+    assert raised.value.product_ids == ["b"]
+    assert (stock(storage, "a"), stock(storage, "b")) == (5, 1)
+    assert "r1" not in storage.reservations.docs
+
+def test_duplicate_reservation_id_takes_stock_once(storage):
+    inventory = Inventory(storage)
+    run(inventory.reserve("r1", "u1", {"a": 2}))
+    with pytest.raises(DuplicateKeyError):
+        run(inventory.reserve("r1", "u1", {"a": 2}))
+    # A retried stock update is skipped for products already holding the reservation
+    assert run(storage.products.reserve_stock("r1", {"a": 2})) == []
+    assert stock(storage, "a") == 3
+
+def test_claim_rejects_other_users_and_expired_reservations(storage):
+    inventory = Inventory(storage, ttl=0)
+    run(inventory.reserve("r1", "u1", {"a": 1}))
+    with pytest.raises(ReservationNotFound):
+        run(inventory.claim("r1", "u1"))
+
+    inventory = Inventory(storage)
+    run(inventory.reserve("r2", "u1", {"a": 1}))
+    with pytest.raises(ReservationNotFound):
+        run(inventory.claim("r2", "u2"))
+    assert run(inventory.claim("r2", "u1"))["id"] == "r2"
+
+def test_release_expired_returns_abandoned_stock(storage):
+    inventory = Inventory(storage, ttl=0)
+    run(inventory.reserve("r1", "u1", {"a": 2}))
+    assert run(inventory.release_expired()) == 1
+    assert stock(storage, "a") == 5
+    assert storage.reservations.docs == {}
+
+def test_release_expired_settles_placed_orders(storage):
+    recovered = []
+
+    async def recover(order):
+        recovered.append(order["orderId"])
+
+    inventory = Inventory(storage, ttl=0, recover=recover)
+    run(inventory.reserve("r1", "u1", {"a": 2}))
+    run(storage.orders.insert({
+        "orderId": "r1", "userId": "u1", "items": [{"productId": "a", "quantity": 2}],
+        "total": 200.0, "status": "pending", "orderDate": datetime.now(timezone.utc).isoformat(),
+    }))
+    assert run(inventory.release_expired()) == 0
+    assert stock(storage, "a") == 3
+    assert storage.products.docs["a"]["reservations"] == []
+    assert recovered == ["r1"]
+    assert storage.reservations.docs == {}
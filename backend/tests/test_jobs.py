@@ -0,0 +1,53 @@
+import asyncio
+from jobs import JobQueue
+from storage import MemoryStorage
+
+async def drain(queue, rounds):
+    for _ in range(rounds):
+        await queue.run_once()
+
+def test_failed_job_is_retried_until_it_succeeds():
+    storage = MemoryStorage()
+    queue = JobQueue(storage, backoff=0)
+    calls = []
+
+    @queue.handler("flaky")
+    async def flaky(payloads):
+        calls.append(payloads)
+        if len(calls) == 1:
+            raise RuntimeError("transient")
+
+    async def scenario():
+        await queue.enqueue("flaky", {"n": 1})
+        await drain(queue, 2)
+
+    asyncio.run(scenario())
+    assert calls == [[{"n": 1}], [{"n": 1}]]
+    assert storage.jobs.docs == {}
+
+def test_job_out_of_attempts_is_kept_dead():
+    storage = MemoryStorage()
+    queue = JobQueue(storage, max_attempts=2, backoff=0)
+
+    @queue.handler("broken")
+    async def broken(payloads):
+        raise RuntimeError("permanent")
+
+    async def scenario():
+        await queue.enqueue("broken", {})
+        await drain(queue, 3)
+
+    asyncio.run(scenario())
+    [job] = storage.jobs.docs.values()
+    assert (job["status"], job["attempts"]) == ("dead", 2)
+    assert "permanent" in job["error"]
+    assert asyncio.run(storage.jobs.counts()) == {"dead": 1}
+
+def test_jobs_without_a_handler_are_retried():
+    storage = MemoryStorage()
+    queue = JobQueue(storage, backoff=0)
+    asyncio.run(queue.enqueue("unknown", {}))
+    asyncio.run(queue.run_once())
+    [job] = storage.jobs.docs.values()
+    assert (job["status"], job["attempts"]) == ("pending", 1)
+    assert "No handler" in job["error"]
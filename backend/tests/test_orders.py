@@ -0,0 +1,43 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from conftest import make_product
+import server
+
+ADDRESS = {
+    "fullName": "Test Buyer", "email": "buyer@example.com", "phone": "9999999999",
+    "addressLine1": "1 Test Street", "city": "Pune", "state": "MH", "pinCode": "411001",
+}
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+@pytest.fixture
+def auth(client):
+    email = f"buyer-{uuid.uuid4().hex[:8]}@example.com"
+    response = client.post("/api/auth/register", json={"name": "Buyer", "email": email, "password": "secret123"})
+    return {"Authorization": f"Bearer {response.json()['access_token']}"}
+
+@pytest.fixture
+def product_id():
+    product_id = f"candle-{uuid.uuid4().hex[:8]}"
+    asyncio.run(server.storage.products.insert(make_product(product_id, stock=1, images=["a.jpg"])))
+    return product_id
+
+def test_retried_order_with_a_reservation_is_placed_once(client, auth, product_id):
+    items = [{"productId": product_id, "quantity": 1}]
+    reservation = client.post("/api/checkout/reserve", json=items, headers=auth).json()
+    order = {"items": items, "shippingAddress": ADDRESS, "paymentMethod": "cod", "reservationId": reservation["reservationId"]}
+
+    first = client.post("/api/orders", json=order, headers=auth)
+    retry = client.post("/api/orders", json=order, headers=auth)
+    assert first.status_code == retry.status_code == 200
+    assert first.json()["orderId"] == retry.json()["orderId"] == reservation["reservationId"]
+    assert server.storage.products.docs[product_id]["stock"] == 0
+
+    # The one unit went to the first order
+    another = client.post("/api/orders", json={**order, "reservationId": None}, headers=auth)
+    assert another.status_code == 409
@@ -0,0 +1,54 @@
+import asyncio
+import pytest
+from conftest import make_product
+from pagination import (
+    PRODUCT_SORT, InvalidCursor, decode_keyset_cursor, decode_offset_cursor, encode_offset_cursor, next_cursor,
+)
+from storage import MemoryStorage
+
+FIELDS = ["id", "dateAdded"]
+
+@pytest.fixture
+def storage():
+    storage = MemoryStorage()
+    # Pairs of products share a dateAdded, so pages must break ties on id
+    for i in range(10):
+        product = make_product(f"p{i}", dateAdded=f"2026-01-{10 - i // 2:02d}T00:00:00+00:00", category="jar" if i % 3 else "pillar")
+        asyncio.run(storage.products.insert(product))
+    return storage
+
+def pages(storage, limit, filters=None):
+    cursor, seen = None, []
+    while True:
+        after = decode_keyset_cursor(cursor, PRODUCT_SORT)
+        page = asyncio.run(storage.products.list(filters or {}, FIELDS, limit, after))
+        seen.append([product["id"] for product in page])
+        cursor = next_cursor(page, limit, PRODUCT_SORT)
+        if cursor is None:
+            return seen
+
+def expected(storage, filters=None):
+    products = [p for p in storage.products.docs.values() if all(p[k] == v for k, v in (filters or {}).items())]
+    return [p["id"] for p in sorted(products, key=lambda p: (p["dateAdded"], p["id"]), reverse=True)]
+
+@pytest.mark.parametrize("limit", [1, 2, 3, 4, 10, 11])
+def test_pages_cover_every_product_once_in_order(storage, limit):
+    seen = pages(storage, limit)
+    assert [product_id for page in seen for product_id in page] == expected(storage)
+    assert all(len(page) == limit for page in seen[:-1])
+
+def test_full_last_page_is_followed_by_an_empty_one(storage):
+    # 10 products in pages of 5: the second page is full, so a cursor is
+    # still returned and the page after it is empty
+    assert [len(page) for page in pages(storage, 5)] == [5, 5, 0]
+
+def test_pages_within_a_filter(storage):
+    seen = pages(storage, 2, {"category": "pillar"})
+    assert [product_id for page in seen for product_id in page] == expected(storage, {"category": "pillar"})
+
+def test_cursor_must_belong_to_the_listing():
+    with pytest.raises(InvalidCursor):
+        decode_keyset_cursor(encode_offset_cursor(10), PRODUCT_SORT)
+    with pytest.raises(InvalidCursor):
+        decode_keyset_cursor("not a cursor", PRODUCT_SORT)
+    assert decode_offset_cursor(encode_offset_cursor(10)) == 10
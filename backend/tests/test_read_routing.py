@@ -0,0 +1,51 @@
+import asyncio
+from cache import CatalogCache
+from storage import MotorProducts
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_refills_read_the_primary_within_the_write_lag():
+    clock = Clock()
+    cache = CatalogCache(write_lag=90, clock=clock)
+    assert not cache.read_primary(["a"])
+
+    cache.stock_changed(["a"])
+    assert cache.read_primary(["a"])
+    assert not cache.read_primary(["b"])
+    assert not cache.read_primary()
+
+    cache.product_updated("b")
+    assert cache.read_primary() and cache.read_primary(["c"])
+    clock.now += 91
+    assert not cache.read_primary(["a"]) and not cache.read_primary()
+
+def test_without_secondary_reads_everything_reads_the_default():
+    cache = CatalogCache()
+    cache.product_updated("a")
+    cache.stock_changed(["a"])
+    assert not cache.read_primary(["a"])
+
+class Collection:
+    def __init__(self, name, calls):
+        self.name = name
+        self.calls = calls
+
+    async def find_one(self, query, projection):
+        self.calls.append(self.name)
+        return {"id": query["id"]}
+
+class Database:
+    def __init__(self, name, calls):
+        self.products = Collection(name, calls)
+
+def test_motor_products_route_primary_reads():
+    calls = []
+    products = MotorProducts(Database("primary", calls), Database("secondary", calls))
+    asyncio.run(products.get("a"))
+    asyncio.run(products.get("a", primary=True))
+    assert calls == ["secondary", "primary"]
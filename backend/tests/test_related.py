@@ -0,0 +1,68 @@
+import asyncio
+import uuid
+import pytest
+from fastapi.testclient import TestClient
+from conftest import make_product
+from related import RelatedProducts, co_occurrence, top_k
+import server
+
+def order(order_id, *product_ids):
+    return {"orderId": order_id, "items": [{"productId": product_id} for product_id in product_ids]}
+
+def test_co_occurrence_counts_pairs_without_the_diagonal():
+    counts = co_occurrence([[0, 1, 2], [0, 1], [2]], 3).toarray().tolist()
+    assert counts == [[0, 2, 1], [2, 0, 1], [1, 1, 0]]
+
+def test_top_k_orders_by_count_then_column():
+    matrix = co_occurrence([[0, 1], [0, 1], [0, 2], [0, 3], [0, 4], [0, 4]], 5)
+    assert dict(top_k(matrix, [0, 3], 3)) == {0: [(1, 2), (4, 2), (2, 1)], 3: [(0, 1)]}
+
+def test_orders_are_counted_once_and_folded_in_on_refresh():
+    related = RelatedProducts(k=2)
+    related.add(order("o1", "a", "b", "c"))
+    related.add(order("o1", "a", "b", "c"))
+    related.add(order("o2", "a", "b"))
+    related.add(order("o3", "a"))
+    assert related.related("a") == []
+    assert related.refresh() == 2
+    assert related.related("a") == [("b", 2), ("c", 1)]
+    assert related.related("a", 1) == [("b", 2)]
+    assert sorted(related.related("c")) == [("a", 1), ("b", 1)]
+    assert related.refresh() == 0
+
+class Orders:
+    def __init__(self, orders):
+        self.orders = orders
+
+    async def iter_items(self):
+        for order in self.orders:
+            yield order
+
+def test_rebuild_recounts_the_history():
+    related = RelatedProducts()
+    related.add(order("stale", "a", "z"))
+    related.refresh()
+    asyncio.run(related.rebuild(Orders([order("o1", "a", "b"), order("o2", "a", "b"), order("o3", "a", "c")])))
+    assert related.related("a") == [("b", 2), ("c", 1)]
+    assert related.related("z") == []
+    related.add(order("o1", "a", "b"))
+    assert related.refresh() == 0
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(server.app) as client:
+        yield client
+
+def test_related_endpoint_serves_up_to_the_largest_limit(client):
+    prefix = f"rel-{uuid.uuid4().hex[:8]}"
+    ids = [f"{prefix}-{i:02d}" for i in range(server.RELATED_LIMIT + 2)]
+    for product_id in ids:
+        asyncio.run(server.storage.products.insert(make_product(product_id)))
+    for i, product_id in enumerate(ids[1:]):
+        server.related_products.add(order(f"{prefix}-o{i}", ids[0], product_id))
+    server.related_products.refresh()
+
+    response = client.get(f"/api/products/{ids[0]}/related", params={"limit": server.RELATED_LIMIT})
+    assert response.status_code == 200
+    assert [p["id"] for p in response.json()] == ids[1:server.RELATED_LIMIT + 1]
+    assert client.get(f"/api/products/{ids[0]}/related", params={"limit": server.RELATED_LIMIT + 1}).status_code == 422
@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from conftest import make_product
+from search import SearchIndex, tokenize
+import server
+
+def product(product_id, name, description="", **fields):
+    return {"id": product_id, "name": name, "description": description, "category": "jar", "fragrance": "vanilla", **fields}
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add(product("a", "Lavender Dream", "calming lavender candle", price=400.0))
+    index.add(product("b", "Ocean Breeze", "fresh sea salt with a hint of lavender", category="pillar", price=800.0))
+    index.add(product("c", "Vanilla Bean", "warm and sweet", featured=True, price=300.0))
+    return index
+
+def test_tokenize_lowercases_and_splits():
+    assert tokenize("Sea-Salt & Lavender 2") == ["sea", "salt", "lavender", "2"]
+
+def test_name_matches_rank_above_description_matches(index):
+    assert index.search("lavender") == ["a", "b"]
+
+def test_every_token_must_match(index):
+    assert index.search("lavender ocean") == ["b"]
+    assert index.search("lavender nothing") == []
+
+def test_prefix_and_typo_matching(index):
+    assert index.search("lav") == ["a", "b"]
+    assert index.search("lavendre") == ["a", "b"]
+    # One edit away; the name match outranks the fragrance matches
+    assert index.search("vanila") == ["c", "a", "b"]
+
+def test_filters_apply_before_the_limit(index):
+    assert index.search("lavender", limit=1, filters={"category": "pillar"}) == ["b"]
+    assert index.search("lavender", filters={"maxPrice": 500}) == ["a"]
+    assert index.search("vanilla", filters={"featured": True}) == ["c"]
+
+def test_update_and_remove_reindex_the_product(index):
+    index.add(product("a", "Cedar Grove", price=400.0))
+    assert index.search("lavender") == ["b"]
+    assert index.search("cedar") == ["a"]
+    index.remove("b")
+    assert index.search("lavender") == []
+    assert len(index) == 2
+
+def test_facet_counts_cover_every_match(index):
+    total, counts, prices = index.facet_counts("lavender", {}, ["category"], [0, 500])
+    assert total == 2
+    assert dict(counts["category"]) == {"jar": 1, "pillar": 1}
+    assert dict(prices) == {0: 1, 500: 1}
+
+def test_search_pages_reach_every_match():
+    for i in range(30):
+        asyncio.run(server.storage.products.insert(make_product(
+            f"lav-{i:02d}", name=f"Lavender {i}", category="pillar" if i % 3 == 0 else "jar",
+        )))
+    with TestClient(server.app) as client:
+        seen, cursor = [], None
+        while True:
+            params = {"search": "lavender", "limit": 7, **({"cursor": cursor} if cursor else {})}
+            response = client.get("/api/products", params=params)
+            seen += [product["id"] for product in response.json()]
+            cursor = response.headers.get("X-Next-Cursor")
+            if cursor is None:
+                break
+        assert sorted(seen) == [f"lav-{i:02d}" for i in range(30)]
+        assert len(seen) == len(set(seen))
+
+        pillars = client.get("/api/products", params={"search": "lavender", "category": "pillar", "limit": 50}).json()
+        assert sorted(p["id"] for p in pillars) == [f"lav-{i:02d}" for i in range(0, 30, 3)]
+
+        facets = client.get("/api/products/facets", params={"search": "lavender"}).json()
+        assert facets["total"] == 30
+        assert {c["value"]: c["count"] for c in facets["category"]} == {"jar": 20, "pillar": 10}
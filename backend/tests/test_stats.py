@@ -0,0 +1,35 @@
+import asyncio
+from stats import get_stats, record_orders_created
+from storage import MemoryStorage
+
+def order(order_id, total=150.0, status="pending"):
+    return {"orderId": order_id, "userId": "u1", "items": [], "total": total, "status": status, "orderDate": f"2026-01-01T00:00:{order_id[-2:]}+00:00"}
+
+def test_retried_order_jobs_count_once():
+    storage = MemoryStorage()
+
+    async def scenario():
+        await record_orders_created(storage.stats, [order("o-01"), order("o-02")])
+        # A retried batch, partly overlapping a new order
+        await record_orders_created(storage.stats, [order("o-02"), order("o-03", status="cancelled")])
+        return await get_stats(storage.stats)
+
+    stats = asyncio.run(scenario())
+    assert stats["totalOrders"] == 3
+    assert stats["totalSales"] == 300.0
+    assert stats["ordersByStatus"] == {"pending": 2, "cancelled": 1}
+
+def test_rebuild_does_not_double_count_queued_orders():
+    storage = MemoryStorage()
+
+    async def scenario():
+        placed = order("o-01")
+        await storage.orders.insert(placed)
+        # The order's stats.order_created job is still queued during the rebuild
+        rebuilt = await storage.stats.rebuild()
+        await record_orders_created(storage.stats, [placed])
+        return rebuilt, await get_stats(storage.stats)
+
+    rebuilt, stats = asyncio.run(scenario())
+    assert "applied" not in rebuilt
+    assert (stats["totalOrders"], stats["totalSales"]) == (1, 150.0)
@@ -0,0 +1,43 @@
+import asyncio
+import pytest
+from pymongo.errors import DuplicateKeyError
+from conftest import make_product
+from storage import MemoryStorage
+
+def run(coro):
+    return asyncio.run(coro)
+
+def ids(products):
+    return [product["id"] for product in products]
+
+@pytest.fixture
+def storage():
+    storage = MemoryStorage()
+    run(storage.products.insert(make_product("a", category="jar", price=100.0, dateAdded="2026-01-03T00:00:00+00:00")))
+    run(storage.products.insert(make_product("b", category="pillar", price=600.0, dateAdded="2026-01-02T00:00:00+00:00")))
+    run(storage.products.insert(make_product("c", category="jar", price=900.0, dateAdded="2026-01-01T00:00:00+00:00")))
+    return storage
+
+def test_list_filters_and_projects(storage):
+    products = run(storage.products.list({"category": "jar", "maxPrice": 500}, ["id", "price"], 10))
+    assert products == [{"id": "a", "price": 100.0}]
+    assert ids(run(storage.products.list({"ids": ["c", "a", "zz"]}, ["id"], 10))) == ["a", "c"]
+
+def test_update_moves_the_product_between_filter_indexes(storage):
+    run(storage.products.update("a", {"category": "pillar"}))
+    assert ids(run(storage.products.list({"category": "jar"}, ["id"], 10))) == ["c"]
+    assert ids(run(storage.products.list({"category": "pillar"}, ["id"], 10))) == ["a", "b"]
+    assert run(storage.products.get("a"))["version"] == 1
+
+def test_delete_unindexes_the_product(storage):
+    assert run(storage.products.delete("a"))
+    assert not run(storage.products.delete("a"))
+    assert ids(run(storage.products.list({}, ["id"], 10))) == ["b", "c"]
+
+def test_unique_keys_are_enforced(storage):
+    with pytest.raises(DuplicateKeyError):
+        run(storage.products.insert(make_product("a")))
+    user = {"id": "u1", "email": "a@example.com", "name": "A", "role": "user", "createdAt": "2026-01-01T00:00:00+00:00"}
+    run(storage.users.insert(user))
+    with pytest.raises(DuplicateKeyError):
+        run(storage.users.insert({**user, "id": "u2"}))